@@ -4,20 +4,29 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 """Creates a copy of a file, with part of the hash in the new filename."""
-# TODO: https://github.com/ninja-build/ninja/issues/1186 - Consider using
-# symlinks instead of copies.
+# Symlinks would confuse ninja's mtime checks, see
+# https://github.com/ninja-build/ninja/issues/1186. Reflinks and hard links
+# don't have that problem, but hard links share their mtime with the input file,
+# so the copy rule needs restat to avoid considering them out of date. The rules
+# that create input files also need to delete their output before writing it,
+# so that they never modify a hard linked output file in place.
 
 import argparse
 import base64
+import collections
 from collections.abc import Sequence
+import fcntl
+import filecmp
 import hashlib
+import io
+import os
 import pathlib
+import shutil
+import sqlite3
+import struct
 import sys
 import textwrap
-
-import PIL.Image
-
-PIL.Image.MAX_IMAGE_PIXELS = None
+from typing import BinaryIO
 
 
 def _ninja_escape(value: str) -> str:
@@ -42,22 +51,257 @@ def _output_filename_path(
     return work_dir / f"{input_file.name}.cache-buster-output-filename"
 
 
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Start Of Frame markers, excluding DHT, JPG, and DAC which share the range.
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Markers without a length or payload.
+_JPEG_STANDALONE_MARKERS = frozenset((0x01, *range(0xD0, 0xD8)))
+
+
+def _png_size(file: BinaryIO) -> tuple[int, int] | None:
+    header = file.read(24)
+    if len(header) < 24 or header[:8] != _PNG_SIGNATURE:
+        return None
+    if header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return width, height
+
+
+def _jpeg_size(file: BinaryIO) -> tuple[int, int] | None:
+    if file.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        if file.read(1) != b"\xff":
+            return None
+        marker = file.read(1)
+        while marker == b"\xff":  # Fill bytes.
+            marker = file.read(1)
+        if not marker or marker[0] == 0xD9:  # End of file or EOI.
+            return None
+        if marker[0] in _JPEG_STANDALONE_MARKERS:
+            continue
+        length_bytes = file.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+        if marker[0] in _JPEG_SOF_MARKERS:
+            sof = file.read(5)
+            if len(sof) < 5:
+                return None
+            _, height, width = struct.unpack(">BHH", sof)
+            return width, height
+        file.seek(length - 2, io.SEEK_CUR)
+
+
+def _webp_size(file: BinaryIO) -> tuple[int, int] | None:
+    header = file.read(30)
+    if len(header) < 30 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        return None
+    match header[12:16]:
+        case b"VP8 ":
+            # https://datatracker.ietf.org/doc/html/rfc6386#section-9.1
+            if header[23:26] != b"\x9d\x01\x2a":
+                return None
+            width, height = struct.unpack("<HH", header[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        case b"VP8L":
+            # https://developers.google.com/speed/webp/docs/webp_lossless_bitstream_specification#3_riff_header
+            if header[20] != 0x2F:
+                return None
+            (bits,) = struct.unpack("<I", header[21:25])
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        case b"VP8X":
+            # https://developers.google.com/speed/webp/docs/riff_container#extended_file_format
+            return (
+                int.from_bytes(header[24:27], "little") + 1,
+                int.from_bytes(header[27:30], "little") + 1,
+            )
+        case _:
+            return None
+
+
+def _image_size(path: pathlib.Path) -> tuple[int, int]:
+    """Returns the width and height of an image.
+
+    Common formats are handled by reading only their headers. Anything else
+    falls back to Pillow, which is much slower to import.
+    """
+    with path.open(mode="rb") as file:
+        for parse in (_png_size, _jpeg_size, _webp_size):
+            file.seek(0)
+            if (size := parse(file)) is not None:
+                return size
+    import PIL.Image
+
+    PIL.Image.MAX_IMAGE_PIXELS = None
+    with PIL.Image.open(path) as image:
+        return image.width, image.height
+
+
+def _hash_cache_connect(path: pathlib.Path) -> sqlite3.Connection:
+    # Many hash edges can run in parallel, so this uses WAL mode and a generous
+    # timeout instead of failing when another process holds the lock.
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    with connection:
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_digests (
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                PRIMARY KEY (device, inode, size, mtime_ns)
+            )
+            """
+        )
+        connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS file_digests_by_path
+            ON file_digests (path)
+            """
+        )
+    return connection
+
+
+# Once the stats log is bigger than this, it's compacted to one line per
+# outcome.
+_HASH_CACHE_STATS_MAX_SIZE = 64 * 1024
+
+
+def _hash_cache_stats_path(hash_cache: pathlib.Path) -> pathlib.Path:
+    return hash_cache.with_name(f"{hash_cache.name}.stats")
+
+
+def _hash_cache_stats_counts(stats: str) -> collections.Counter[str]:
+    # Each line is either an outcome or, after compaction, an outcome and a
+    # count.
+    counts = collections.Counter[str]()
+    for line in stats.splitlines():
+        outcome, _, count = line.partition(" ")
+        counts[outcome] += int(count or 1)
+    return counts
+
+
+def _hash_cache_count(hash_cache: pathlib.Path, outcome: str) -> None:
+    # This is an append-only log instead of a table, so that cache hits don't
+    # need to wait for SQLite's write lock. Each line is a single small write to
+    # a file opened with O_APPEND, so parallel edges don't interleave.
+    with _hash_cache_stats_path(hash_cache).open(mode="a+") as stats:
+        stats.write(f"{outcome}\n")
+        stats.flush()
+        if stats.tell() <= _HASH_CACHE_STATS_MAX_SIZE:
+            return
+        try:
+            fcntl.flock(stats.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process is already compacting it.
+            return
+        # Appends from other processes between reading and truncating are lost,
+        # which is fine for approximate stats.
+        stats.seek(0)
+        counts = _hash_cache_stats_counts(stats.read())
+        stats.truncate(0)
+        stats.write(
+            "".join(f"{outcome} {count}\n" for outcome, count in counts.items())
+        )
+
+
+def _file_digest(
+    path: pathlib.Path,
+    *,
+    hash_cache: pathlib.Path | None,
+) -> bytes:
+    """Returns the sha256 digest of a file.
+
+    Args:
+        path: File to hash.
+        hash_cache: Optional cache of digests keyed by stat results, so that
+            unchanged files don't need to be read again. When only the device
+            or inode changes, e.g., after rsync -a or cp -p, the row for the
+            same path, size, and mtime is used without reading the file. When
+            the mtime changes, e.g., after touch or a fresh checkout, the file
+            is hashed again.
+    """
+    if hash_cache is None:
+        with path.open(mode="rb") as input_file:
+            return hashlib.file_digest(input_file, "sha256").digest()
+    with path.open(mode="rb") as input_file:
+        stat = os.fstat(input_file.fileno())
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        path_str = str(path.absolute())
+        connection = _hash_cache_connect(hash_cache)
+        try:
+            row = connection.execute(
+                """
+                SELECT digest FROM file_digests
+                WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?
+                """,
+                key,
+            ).fetchone()
+            if row is not None:
+                _hash_cache_count(hash_cache, "hit")
+                return bytes(row[0])
+            row = connection.execute(
+                """
+                SELECT digest FROM file_digests
+                WHERE path = ? AND size = ? AND mtime_ns = ?
+                """,
+                (path_str, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+            if row is None:
+                digest = hashlib.file_digest(input_file, "sha256").digest()
+                outcome = "miss"
+            else:
+                digest = bytes(row[0])
+                outcome = "path-hit"
+            with connection:
+                # This keeps one row per path, so that rows for old versions of
+                # files don't pile up.
+                connection.execute(
+                    "DELETE FROM file_digests WHERE path = ?",
+                    (path_str,),
+                )
+                connection.execute(
+                    """
+                    INSERT OR REPLACE INTO file_digests
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (*key, path_str, digest),
+                )
+            _hash_cache_count(hash_cache, outcome)
+            return digest
+        finally:
+            connection.close()
+
+
 def _hash(args: argparse.Namespace) -> None:
+    digest = _file_digest(args.input_file, hash_cache=args.hash_cache)
     # This is truncated to a multiple of 3 to avoid base64 padding.
-    file_hash = base64.urlsafe_b64encode(
-        hashlib.sha256(args.input_file.read_bytes()).digest()[:18]
-    ).decode()
+    file_hash = base64.urlsafe_b64encode(digest[:18]).decode()
     assert "=" not in file_hash
     if args.image:
-        with PIL.Image.open(args.input_file) as image:
-            output_filename_extra = f"-{image.width}x{image.height}"
+        width, height = _image_size(args.input_file)
+        output_filename_extra = f"-{width}x{height}"
     else:
         output_filename_extra = ""
+    # Sharding by the hash keeps the number of entries in each directory
+    # manageable even with lots of assets.
+    shards = "".join(
+        f"{file_hash[2 * depth:2 * depth + 2]}/"
+        for depth in range(args.shard_depth)
+    )
     _output_filename_path(
         work_dir=args.work_dir,
         input_file=args.input_file,
     ).write_text(
-        f"output/assets/{args.output_filename_base.stem}{output_filename_extra}"
+        f"output/assets/{shards}"
+        f"{args.output_filename_base.stem}{output_filename_extra}"
         f"-{file_hash}{args.output_filename_base.suffix}"
     )
 
@@ -85,6 +329,34 @@ def _dyndep(args: argparse.Namespace) -> None:
     )
 
 
+def _clone_or_link_or_copy(
+    input_file: pathlib.Path,
+    output_path: pathlib.Path,
+) -> None:
+    """Makes output_path have the same contents as input_file.
+
+    This tries a reflink first, then a hard link, then a copy.
+    """
+    output_path.unlink(missing_ok=True)
+    try:
+        with (
+            input_file.open(mode="rb") as input_,
+            output_path.open(mode="xb") as output,
+        ):
+            fcntl.ioctl(output.fileno(), fcntl.FICLONE, input_.fileno())
+        return
+    except OSError:
+        output_path.unlink(missing_ok=True)
+    try:
+        output_path.hardlink_to(input_file)
+        return
+    except OSError:
+        pass
+    # On Linux, this uses os.sendfile() to avoid copying the data through
+    # userspace.
+    shutil.copyfile(input_file, output_path)
+
+
 def _copy(args: argparse.Namespace) -> None:
     written = set[pathlib.Path]()
     for input_file in args.input_file:
@@ -95,17 +367,52 @@ def _copy(args: argparse.Namespace) -> None:
             ).read_text()
         )
         if output_path in written:
-            if input_file.read_bytes() != output_path.read_bytes():
+            if not filecmp.cmp(input_file, output_path, shallow=False):
                 raise ValueError(
                     "Multiple files with different contents hash to "
                     f"{str(output_path)!r}"
                 )
         else:
-            output_path.write_bytes(input_file.read_bytes())
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            _clone_or_link_or_copy(input_file, output_path)
             written.add(output_path)
     args.copy_stamp.write_text("")
 
 
+def _stats(args: argparse.Namespace) -> None:
+    if args.hash_cache is None:
+        raise ValueError("The stats subcommand requires --hash-cache.")
+    connection = _hash_cache_connect(args.hash_cache)
+    try:
+        (entries,) = connection.execute(
+            "SELECT COUNT(*) FROM file_digests"
+        ).fetchone()
+    finally:
+        connection.close()
+    stats_path = _hash_cache_stats_path(args.hash_cache)
+    if stats_path.exists():
+        counts = _hash_cache_stats_counts(stats_path.read_text())
+    else:
+        counts = collections.Counter()
+    hits = counts["hit"]
+    path_hits = counts["path-hit"]
+    misses = counts["miss"]
+    lookups = hits + path_hits + misses
+    hit_rate = (hits + path_hits) / lookups if lookups else 0.0
+    print(
+        textwrap.dedent(
+            f"""\
+            entries: {entries}
+            hits: {hits}
+            path hits: {path_hits}
+            misses: {misses}
+            hit rate: {hit_rate:.1%}
+            """
+        ),
+        end="",
+    )
+
+
 def main(
     *,
     args: Sequence[str] = sys.argv[1:],
@@ -117,6 +424,14 @@ def main(
         required=True,
         help="Directory to keep work files in.",
     )
+    parser.add_argument(
+        "--hash-cache",
+        type=pathlib.Path,
+        help=(
+            "SQLite database to cache file hashes in, keyed by device, inode, "
+            "size, and mtime."
+        ),
+    )
     parser.set_defaults(subcommand=lambda args: parser.print_help())
     subparsers = parser.add_subparsers()
 
@@ -136,6 +451,15 @@ def main(
         action="store_true",
         help="Add the image's size to the output filename",
     )
+    hash_parser.add_argument(
+        "--shard-depth",
+        type=int,
+        default=0,
+        help=(
+            "Number of levels of subdirectories to put the output in, each "
+            "named with the next two characters of the hash."
+        ),
+    )
     hash_parser.add_argument(
         "input_file",
         type=pathlib.Path,
@@ -168,7 +492,7 @@ def main(
 
     copy_parser = subparsers.add_parser(
         "copy",
-        help="Create a copy containing the hash in the filename.",
+        help="Create a copy or link containing the hash in the filename.",
     )
     copy_parser.set_defaults(subcommand=_copy)
     copy_parser.add_argument(
@@ -184,6 +508,12 @@ def main(
         help="File to hash and copy.",
     )
 
+    stats_parser = subparsers.add_parser(
+        "stats",
+        help="Print statistics about the hash cache.",
+    )
+    stats_parser.set_defaults(subcommand=_stats)
+
     parsed_args = parser.parse_args(args)
     parsed_args.subcommand(parsed_args)
 
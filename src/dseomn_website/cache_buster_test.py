@@ -4,9 +4,18 @@
 
 from collections.abc import Generator
 import contextlib
+import fcntl
 import importlib.resources
+import os
 import pathlib
+import shutil
+import subprocess
+import sys
+import textwrap
+from typing import Any
 
+import PIL.ExifTags
+import PIL.Image
 import pytest
 
 from dseomn_website import cache_buster
@@ -53,6 +62,28 @@ def test_hash_normal(
     ).read_text() == expected_output_path
 
 
+def test_hash_sharded() -> None:
+    work_path = pathlib.Path("work")
+    work_path.mkdir()
+    (work_path / "some-file.txt").write_text("kumquat")
+
+    cache_buster.main(
+        args=(
+            f"--work-dir={work_path}",
+            "hash",
+            "--output-filename-base=some-file.txt",
+            "--shard-depth=2",
+            "work/some-file.txt",
+        )
+    )
+
+    assert (
+        work_path / "some-file.txt.cache-buster-output-filename"
+    ).read_text() == (
+        "output/assets/bq/8U/some-file-bq8UGvsFuv-F1FnQBRj4UDpo.txt"
+    )
+
+
 def test_hash_image() -> None:
     work_path = pathlib.Path("work")
     work_path.mkdir()
@@ -77,6 +108,181 @@ def test_hash_image() -> None:
     )
 
 
+def test_hash_cache(capsys: pytest.CaptureFixture[str]) -> None:
+    work_path = pathlib.Path("work")
+    work_path.mkdir()
+    input_path = work_path / "some-file.txt"
+    output_filename_path = (
+        work_path / "some-file.txt.cache-buster-output-filename"
+    )
+    hash_cache_args = (
+        f"--work-dir={work_path}",
+        "--hash-cache=work/hash-cache.sqlite3",
+    )
+    hash_args = (
+        *hash_cache_args,
+        "hash",
+        "--output-filename-base=some-file.txt",
+        str(input_path),
+    )
+    input_path.write_text("kumquat")
+    os.utime(input_path, ns=(1_000_000_000, 1_000_000_000))
+
+    cache_buster.main(args=hash_args)
+    output_filename_path.unlink()
+    cache_buster.main(args=hash_args)
+    first_output = output_filename_path.read_text()
+    input_path.write_text("pumpkin")
+    os.utime(input_path, ns=(2_000_000_000, 2_000_000_000))
+    cache_buster.main(args=hash_args)
+    second_output = output_filename_path.read_text()
+    capsys.readouterr()
+    cache_buster.main(args=(*hash_cache_args, "stats"))
+
+    assert first_output == (
+        "output/assets/some-file-bq8UGvsFuv-F1FnQBRj4UDpo.txt"
+    )
+    assert second_output != first_output
+    assert capsys.readouterr().out == textwrap.dedent(
+        """\
+        entries: 1
+        hits: 1
+        path hits: 0
+        misses: 2
+        hit rate: 33.3%
+        """
+    )
+
+
+def test_hash_cache_path_fallback(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    work_path = pathlib.Path("work")
+    work_path.mkdir()
+    input_path = work_path / "some-file.txt"
+    output_filename_path = (
+        work_path / "some-file.txt.cache-buster-output-filename"
+    )
+    hash_cache_args = (
+        f"--work-dir={work_path}",
+        "--hash-cache=work/hash-cache.sqlite3",
+    )
+    hash_args = (
+        *hash_cache_args,
+        "hash",
+        "--output-filename-base=some-file.txt",
+        str(input_path),
+    )
+    input_path.write_text("kumquat")
+    os.utime(input_path, ns=(1_000_000_000, 1_000_000_000))
+    cache_buster.main(args=hash_args)
+    # Like rsync -a or cp -p, with a new inode and the same mtime. The cache
+    # entry is for the old contents, to show that the file isn't read again.
+    new_path = work_path / "some-file.txt.new"
+    new_path.write_text("pumpkin")
+    os.utime(new_path, ns=(1_000_000_000, 1_000_000_000))
+    new_path.replace(input_path)
+    cache_buster.main(args=hash_args)
+    path_hit_output = output_filename_path.read_text()
+    cache_buster.main(args=hash_args)
+    # Like touch or a fresh checkout.
+    os.utime(input_path, ns=(2_000_000_000, 2_000_000_000))
+    cache_buster.main(args=hash_args)
+    miss_output = output_filename_path.read_text()
+    capsys.readouterr()
+    cache_buster.main(args=(*hash_cache_args, "stats"))
+
+    assert path_hit_output == (
+        "output/assets/some-file-bq8UGvsFuv-F1FnQBRj4UDpo.txt"
+    )
+    assert miss_output != path_hit_output
+    assert capsys.readouterr().out == textwrap.dedent(
+        """\
+        entries: 1
+        hits: 1
+        path hits: 1
+        misses: 2
+        hit rate: 50.0%
+        """
+    )
+
+
+def test_hash_cache_stats_compacted(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(cache_buster, "_HASH_CACHE_STATS_MAX_SIZE", 16)
+    work_path = pathlib.Path("work")
+    work_path.mkdir()
+    input_path = work_path / "some-file.txt"
+    hash_cache_args = (
+        f"--work-dir={work_path}",
+        "--hash-cache=work/hash-cache.sqlite3",
+    )
+    input_path.write_text("kumquat")
+    for _ in range(10):
+        cache_buster.main(
+            args=(
+                *hash_cache_args,
+                "hash",
+                "--output-filename-base=some-file.txt",
+                str(input_path),
+            )
+        )
+    capsys.readouterr()
+    cache_buster.main(args=(*hash_cache_args, "stats"))
+
+    assert len(pathlib.Path("work/hash-cache.sqlite3.stats").read_text()) <= 16
+    assert capsys.readouterr().out == textwrap.dedent(
+        """\
+        entries: 1
+        hits: 9
+        path hits: 0
+        misses: 1
+        hit rate: 90.0%
+        """
+    )
+
+
+def test_stats_requires_hash_cache() -> None:
+    with pytest.raises(ValueError, match="requires --hash-cache"):
+        cache_buster.main(args=("--work-dir=work", "stats"))
+
+
+def _exif_with_orientation() -> PIL.Image.Exif:
+    exif = PIL.Image.Exif()
+    exif[PIL.ExifTags.Base.Orientation] = 6
+    return exif
+
+
+@pytest.mark.parametrize(
+    "mode,format_,save_kwargs,header_only",
+    (
+        ("RGB", "PNG", {}, True),
+        ("RGB", "JPEG", {}, True),
+        ("RGB", "JPEG", {"progressive": True}, True),
+        ("RGB", "JPEG", {"exif": _exif_with_orientation()}, True),
+        ("RGB", "WEBP", {}, True),
+        ("RGB", "WEBP", {"lossless": True}, True),
+        ("RGBA", "WEBP", {}, True),  # Extended format, for alpha.
+        ("RGB", "GIF", {}, False),
+    ),
+)
+def test_image_size(
+    mode: str,
+    format_: str,
+    save_kwargs: dict[str, Any],
+    header_only: bool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    path = pathlib.Path("image")
+    PIL.Image.new(mode, (17, 9)).save(path, format=format_, **save_kwargs)
+    if header_only:
+        monkeypatch.setattr(PIL.Image, "open", _raise_os_error)
+
+    assert cache_buster._image_size(path) == (17, 9)
+
+
 def test_dyndep() -> None:
     work_path = pathlib.Path("work")
     work_path.mkdir()
@@ -126,7 +332,9 @@ def test_copy_multiple() -> None:
     (work_path / "file1b").write_text("kumquat")
     (work_path / "file1b.cache-buster-output-filename").write_text("work/out1")
     (work_path / "file2").write_text("pomelo")
-    (work_path / "file2.cache-buster-output-filename").write_text("work/out2")
+    (work_path / "file2.cache-buster-output-filename").write_text(
+        "work/ab/cd/out2"
+    )
     copy_stamp_path = work_path / "copy-stamp"
 
     cache_buster.main(
@@ -141,5 +349,112 @@ def test_copy_multiple() -> None:
     )
 
     assert (work_path / "out1").read_text() == "kumquat"
-    assert (work_path / "out2").read_text() == "pomelo"
+    assert (work_path / "ab/cd/out2").read_text() == "pomelo"
     assert copy_stamp_path.exists()
+
+
+def _raise_os_error(*args: Any, **kwargs: Any) -> None:
+    raise OSError()
+
+
+@pytest.mark.parametrize(
+    "reflink_works,hardlink_works,expected_same_file",
+    (
+        (False, True, True),
+        (False, False, False),
+    ),
+)
+def test_copy_fallback(
+    reflink_works: bool,
+    hardlink_works: bool,
+    expected_same_file: bool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    if not reflink_works:
+        monkeypatch.setattr(fcntl, "ioctl", _raise_os_error)
+    if not hardlink_works:
+        monkeypatch.setattr(pathlib.Path, "hardlink_to", _raise_os_error)
+    work_path = pathlib.Path("work")
+    work_path.mkdir()
+    (work_path / "file").write_text("kumquat")
+    (work_path / "file.cache-buster-output-filename").write_text("work/out")
+    (work_path / "out").write_text("stale contents from a previous build")
+
+    cache_buster.main(
+        args=(
+            f"--work-dir={work_path}",
+            "copy",
+            "--copy-stamp=work/copy-stamp",
+            "work/file",
+        )
+    )
+
+    assert (work_path / "out").read_text() == "kumquat"
+    assert (work_path / "out").samefile(work_path / "file") == (
+        expected_same_file
+    )
+
+
+def _max_rss_kib(*args: str) -> int:
+    """Returns the peak RSS of running cache_buster in a new process."""
+    result = subprocess.run(
+        (
+            sys.executable,
+            "-c",
+            textwrap.dedent(
+                """\
+                import resource
+                import runpy
+                import sys
+
+                sys.argv = sys.argv[1:]
+                runpy.run_path(sys.argv[0], run_name="__main__")
+                print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+                """
+            ),
+            cache_buster.__file__,
+            *args,
+        ),
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    return int(result.stdout)
+
+
+@pytest.mark.slow
+def test_peak_memory_does_not_grow_with_file_size() -> None:
+    work_path = pathlib.Path("work")
+    work_path.mkdir()
+    pathlib.Path("output/assets").mkdir(parents=True)
+    max_rss_kib_by_size = {}
+    for size in (1 << 20, 1 << 28):
+        input_path = work_path / f"file-{size}"
+        with input_path.open(mode="wb") as input_file:
+            input_file.truncate(size)
+        shutil.copyfile(input_path, work_path / f"file-{size}-dup")
+        max_rss_kib_by_size[size] = max(
+            _max_rss_kib(
+                f"--work-dir={work_path}",
+                "hash",
+                f"--output-filename-base=out-{size}",
+                str(input_path),
+            ),
+            _max_rss_kib(
+                f"--work-dir={work_path}",
+                "hash",
+                f"--output-filename-base=out-{size}",
+                f"{input_path}-dup",
+            ),
+            _max_rss_kib(
+                f"--work-dir={work_path}",
+                "copy",
+                f"--copy-stamp={work_path}/copy-stamp-{size}",
+                str(input_path),
+                f"{input_path}-dup",
+            ),
+        )
+
+    # The larger file is 256MiB larger, so reading it all into memory would
+    # blow way past this.
+    assert max_rss_kib_by_size[1 << 28] - max_rss_kib_by_size[1 << 20] < 16384
@@ -0,0 +1,467 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+"""Imports comments from emails sent to the reply addresses on posts.
+
+Run this from the root of the repo, e.g.:
+
+    PYTHONPATH=src python3 -m dseomn_website.comment_import --mbox=FILE
+
+Messages are read one at a time and each comment is written as soon as its
+message is read, so memory use doesn't grow with the size of the mailbox. After
+all messages are read, each post with new comments has its metadata.toml
+updated once. Messages that can't be imported are reported and skipped.
+Importing the same message again does nothing, since the comment's uuid comes
+from the message's Message-ID.
+"""
+
+import argparse
+import collections
+from collections.abc import Callable, Iterable, Mapping, Sequence
+import dataclasses
+import datetime
+import email.header
+import email.message
+import email.utils
+import html
+import json
+import mailbox
+import pathlib
+import re
+import sys
+import tomllib
+from typing import Any
+import uuid
+
+from dseomn_website import comment_pack
+from dseomn_website import lint
+
+# Namespace for comment uuids derived from Message-IDs.
+_MESSAGE_ID_NAMESPACE = uuid.UUID("0ac7d1a4-1a4c-4b62-8c3f-6c6ab1a14e52")
+_REPLY_TO_ADDRESS = re.compile(
+    r"\+website-reply-to-([0-9a-f]{8}-(?:[0-9a-f]{4}-){3}[0-9a-f]{12})@",
+    flags=re.IGNORECASE,
+)
+_ADDRESS_HEADERS = ("Delivered-To", "X-Original-To", "To", "Cc")
+_COMMENTS_LIST = re.compile(
+    r'^comments = \[\n(?:  "[^"\n]*",\n)*\]\n',
+    flags=re.MULTILINE,
+)
+_TABLE = re.compile(r"^\[", flags=re.MULTILINE)
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class _Post:
+    id: str
+    metadata_path: pathlib.Path
+    private_path: pathlib.Path
+    packed: bool
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class _Target:
+    post: _Post
+    in_reply_to: uuid.UUID | None
+
+
+def _published(raw: Any) -> datetime.datetime:
+    if isinstance(raw, datetime.datetime):
+        return raw
+    return email.utils.parsedate_to_datetime(raw)
+
+
+def _load_posts(
+    *,
+    posts_dir: pathlib.Path,
+    private_posts_dir: pathlib.Path,
+) -> dict[uuid.UUID, _Target]:
+    """Returns what a reply to each post or comment uuid would be a reply to."""
+    target_by_uuid = dict[uuid.UUID, _Target]()
+    for metadata_path in sorted(posts_dir.glob("*/metadata.toml")):
+        raw = tomllib.loads(metadata_path.read_text())
+        post = _Post(
+            id=metadata_path.parent.name,
+            metadata_path=metadata_path,
+            private_path=private_posts_dir / metadata_path.parent.name,
+            packed=raw.get("comments_format") == "pack",
+        )
+        target_by_uuid[uuid.UUID(raw["uuid"])] = _Target(
+            post=post,
+            in_reply_to=None,
+        )
+        for comment_uuid in map(uuid.UUID, raw.get("comments", ())):
+            target_by_uuid[comment_uuid] = _Target(
+                post=post,
+                in_reply_to=comment_uuid,
+            )
+    return target_by_uuid
+
+
+def _target_uuid(message: email.message.Message) -> uuid.UUID | None:
+    for header in _ADDRESS_HEADERS:
+        for value in message.get_all(header, ()):
+            if match := _REPLY_TO_ADDRESS.search(value):
+                return uuid.UUID(match[1])
+    return None
+
+
+def _toml_string(value: str) -> str:
+    # JSON strings without non-ASCII escapes are valid TOML basic strings.
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _text_to_html(text: str) -> str:
+    paragraphs = re.split(r"\n\s*\n", text.strip())
+    return "".join(
+        f"<p>{html.escape(paragraph.strip(), quote=False)}</p>\n"
+        for paragraph in paragraphs
+        if paragraph.strip()
+    )
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class _ParsedBody:
+    name: str | None
+    uri: str | None
+    contents: str
+
+
+def _plain_text(message: email.message.Message) -> str:
+    for part in message.walk():
+        if (
+            part.get_content_type() == "text/plain"
+            and part.get_content_disposition() != "attachment"
+        ):
+            payload = part.get_payload(decode=True)
+            assert isinstance(payload, bytes)
+            return payload.decode(
+                part.get_content_charset() or "us-ascii",
+                errors="replace",
+            )
+    raise ValueError("No text/plain body.")
+
+
+def _parse_body(message: email.message.Message) -> _ParsedBody:
+    """Parses the fields in the body that the reply links fill in."""
+    lines = list[str]()
+    for line in _plain_text(message).splitlines():
+        if line == "-- ":
+            # Signature.
+            break
+        if not line.startswith(">"):
+            lines.append(line)
+    name = None
+    uri = None
+    for index, line in enumerate(lines):
+        key, colon, value = line.partition(":")
+        if not colon:
+            continue
+        match key.strip().lower():
+            case "name":
+                name = value.strip() or None
+            case "uri" | "uri (optional)":
+                uri = value.strip() or None
+            case "comment":
+                lines = [value, *lines[index + 1 :]]
+                break
+    return _ParsedBody(
+        name=name,
+        uri=uri,
+        contents=_text_to_html("\n".join(lines)),
+    )
+
+
+def _comment_files(
+    message: email.message.Message,
+    *,
+    in_reply_to: uuid.UUID | None,
+    published_by_uuid: Mapping[uuid.UUID, datetime.datetime],
+) -> tuple[datetime.datetime, str, str]:
+    """Returns the published time, metadata, and contents of a comment.
+
+    Args:
+        message: Message to get the comment from.
+        in_reply_to: Comment that the message is a reply to, if any.
+        published_by_uuid: Published time of each comment on the same post.
+    """
+    date = message["Date"]
+    if date is None:
+        raise ValueError("No Date header.")
+    published = email.utils.parsedate_to_datetime(date)
+    if published.tzinfo is None:
+        raise ValueError(f"Date has no timezone: {date!r}")
+    # The build fails if a reply isn't after its parent, so check that before
+    # writing anything. Comments with the same time are fine.
+    if in_reply_to is not None and published <= published_by_uuid[in_reply_to]:
+        raise ValueError(f"Date is not after {in_reply_to}: {date!r}")
+    parsed = _parse_body(message)
+    name = parsed.name
+    if name is None and (from_ := message["From"]) is not None:
+        name = str(
+            email.header.make_header(
+                email.header.decode_header(email.utils.parseaddr(from_)[0])
+            )
+        )
+    if not name:
+        raise ValueError("No name.")
+    lint.comment(parsed.contents)
+    metadata_lines = [
+        f"published = {_toml_string(email.utils.format_datetime(published))}",
+        f"author.name = {_toml_string(name)}",
+    ]
+    if parsed.uri is not None:
+        metadata_lines.append(f"author.uri = {_toml_string(parsed.uri)}")
+    if in_reply_to is not None:
+        metadata_lines.append(f"in_reply_to = {_toml_string(str(in_reply_to))}")
+    return (
+        published,
+        "".join(f"{line}\n" for line in metadata_lines),
+        parsed.contents,
+    )
+
+
+def _existing_comments(post: _Post) -> Iterable[tuple[uuid.UUID, str]]:
+    """Yields the uuid and metadata of each existing comment on a post."""
+    if post.packed:
+        for comment_uuid, entry in comment_pack.loads(
+            (post.private_path / "comments.pack").read_text()
+        ).items():
+            yield comment_uuid, entry.metadata
+    else:
+        for metadata_path in (post.private_path / "comments").glob("*.toml"):
+            yield uuid.UUID(metadata_path.stem), metadata_path.read_text()
+
+
+def _with_comments_list(
+    metadata: str, comment_uuids: Sequence[uuid.UUID]
+) -> str:
+    comments_list = "".join(
+        (
+            "comments = [\n",
+            *(f'  "{comment_uuid}",\n' for comment_uuid in comment_uuids),
+            "]\n",
+        )
+    )
+    if _COMMENTS_LIST.search(metadata):
+        return _COMMENTS_LIST.sub(
+            lambda match: comments_list, metadata, count=1
+        )
+    if "\ncomments =" in metadata:
+        raise ValueError("Can't parse the existing comments list.")
+    if table := _TABLE.search(metadata):
+        # Top-level keys have to come before the first table.
+        before = metadata[: table.start()].rstrip("\n")
+        return f"{before}\n{comments_list}\n{metadata[table.start() :]}"
+    return f"{metadata.rstrip("\n")}\n{comments_list}"
+
+
+def _published_by_uuid(post: _Post) -> dict[uuid.UUID, datetime.datetime]:
+    """Returns the published time of each existing comment on a post."""
+    return {
+        comment_uuid: _published(tomllib.loads(metadata)["published"])
+        for comment_uuid, metadata in _existing_comments(post)
+    }
+
+
+def _replace_files(contents_by_path: Mapping[pathlib.Path, str]) -> None:
+    """Replaces files, after writing all of their new contents."""
+    new_path_by_path = {
+        path: path.with_name(f"{path.name}.new") for path in contents_by_path
+    }
+    for path, contents in contents_by_path.items():
+        new_path_by_path[path].write_text(contents)
+    for path, new_path in new_path_by_path.items():
+        new_path.replace(path)
+
+
+def _update_post(
+    post: _Post,
+    new_comments: Iterable[uuid.UUID],
+    *,
+    published_by_uuid: Mapping[uuid.UUID, datetime.datetime],
+) -> None:
+    """Adds new comments, which are already written, to a post's metadata.
+
+    Args:
+        post: Post to update.
+        new_comments: Comments to add.
+        published_by_uuid: Published time of each existing and new comment.
+    """
+    new_comments = tuple(new_comments)
+    pack_entries = dict[uuid.UUID, comment_pack.Entry]()
+    if post.packed:
+        for comment_uuid in new_comments:
+            metadata_path = post.private_path / f"comments/{comment_uuid}.toml"
+            pack_entries[comment_uuid] = comment_pack.Entry(
+                metadata=metadata_path.read_text(),
+                contents=metadata_path.with_suffix(".html").read_text(),
+            )
+    metadata = post.metadata_path.read_text()
+    listed = tuple(map(uuid.UUID, tomllib.loads(metadata).get("comments", ())))
+    # Comments with the same time stay in the order they were added.
+    comment_uuids = sorted(
+        (*listed, *new_comments),
+        key=lambda comment_uuid: published_by_uuid[comment_uuid],
+    )
+    updated = _with_comments_list(metadata, comment_uuids)
+    if tomllib.loads(updated).get("comments") != list(map(str, comment_uuids)):
+        raise ValueError(f"Failed to update {post.metadata_path}")
+    if not post.packed:
+        post.metadata_path.write_text(updated)
+        return
+    # The pack and metadata.toml have to match, so everything that could fail
+    # is done before either of them is replaced.
+    comments_path = post.private_path / "comments"
+    new_paths = {
+        comments_path / f"{comment_uuid}{suffix}"
+        for comment_uuid in new_comments
+        for suffix in (".toml", ".html")
+    }
+    if unexpected_paths := set(comments_path.iterdir()) - new_paths:
+        raise ValueError(
+            f"Unexpected files in {comments_path}: {sorted(unexpected_paths)}"
+        )
+    pack_path = post.private_path / "comments.pack"
+    pack_entries.update(comment_pack.loads(pack_path.read_text()))
+    _replace_files(
+        {
+            pack_path: comment_pack.dumps(pack_entries),
+            post.metadata_path: updated,
+        }
+    )
+    for path in new_paths:
+        path.unlink()
+    comments_path.rmdir()
+
+
+def _messages(args: argparse.Namespace) -> Iterable[email.message.Message]:
+    mailboxes = list[mailbox.Mailbox[Any]]()
+    for path in args.mbox:
+        mailboxes.append(mailbox.mbox(path, create=False))
+    for path in args.maildir:
+        mailboxes.append(mailbox.Maildir(path, create=False))
+    for mailbox_ in mailboxes:
+        # This parses one message at a time, instead of loading all of them. It
+        # uses the compat32 policy, since parsing every header with the default
+        # policy takes most of the time with large mailboxes.
+        for key in mailbox_.iterkeys():
+            yield email.message_from_bytes(mailbox_.get_bytes(key))
+        mailbox_.close()
+
+
+def import_comments(
+    messages: Iterable[email.message.Message],
+    *,
+    posts_dir: pathlib.Path,
+    private_posts_dir: pathlib.Path,
+    report: Callable[[str], None],
+) -> Mapping[str, int]:
+    """Imports comments from messages.
+
+    Args:
+        messages: Messages to import.
+        posts_dir: Directory with a subdirectory for each post.
+        private_posts_dir: Directory with the posts' private files.
+        report: Called with a description of each message that's skipped.
+
+    Returns:
+        Number of new comments on each post.
+    """
+    target_by_uuid = _load_posts(
+        posts_dir=posts_dir,
+        private_posts_dir=private_posts_dir,
+    )
+    new_comments_by_post = collections.defaultdict[_Post, list[uuid.UUID]](list)
+    published_by_post = dict[_Post, dict[uuid.UUID, datetime.datetime]]()
+    for message in messages:
+        message_id = message.get("Message-ID", "").strip()
+        if not message_id:
+            report(f"Skipping message without Message-ID: {message['Subject']}")
+            continue
+        comment_uuid = uuid.uuid5(_MESSAGE_ID_NAMESPACE, message_id)
+        if comment_uuid in target_by_uuid:
+            continue
+        target_uuid = _target_uuid(message)
+        if target_uuid is None or target_uuid not in target_by_uuid:
+            report(f"Skipping {message_id}: unknown reply address.")
+            continue
+        target = target_by_uuid[target_uuid]
+        if target.post not in published_by_post:
+            published_by_post[target.post] = _published_by_uuid(target.post)
+        published_by_uuid = published_by_post[target.post]
+        try:
+            published, metadata, contents = _comment_files(
+                message,
+                in_reply_to=target.in_reply_to,
+                published_by_uuid=published_by_uuid,
+            )
+        except (ValueError, LookupError) as e:
+            report(f"Skipping {message_id}: {e}")
+            continue
+        comments_path = target.post.private_path / "comments"
+        comments_path.mkdir(parents=True, exist_ok=True)
+        (comments_path / f"{comment_uuid}.toml").write_text(metadata)
+        (comments_path / f"{comment_uuid}.html").write_text(contents)
+        new_comments_by_post[target.post].append(comment_uuid)
+        published_by_uuid[comment_uuid] = published
+        # Later messages can be replies to this one.
+        target_by_uuid[comment_uuid] = _Target(
+            post=target.post,
+            in_reply_to=comment_uuid,
+        )
+    for post, new_comments in new_comments_by_post.items():
+        _update_post(
+            post,
+            new_comments,
+            published_by_uuid=published_by_post[post],
+        )
+    return {
+        post.id: len(new_comments)
+        for post, new_comments in new_comments_by_post.items()
+    }
+
+
+def main(
+    *,
+    args: Sequence[str] = sys.argv[1:],
+) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--mbox",
+        type=pathlib.Path,
+        action="append",
+        default=[],
+        help="mbox file to import from.",
+    )
+    parser.add_argument(
+        "--maildir",
+        type=pathlib.Path,
+        action="append",
+        default=[],
+        help="Maildir to import from.",
+    )
+    parser.add_argument(
+        "--posts-dir",
+        type=pathlib.Path,
+        default=pathlib.Path("posts"),
+        help="Directory with a subdirectory for each post.",
+    )
+    parser.add_argument(
+        "--private-posts-dir",
+        type=pathlib.Path,
+        default=pathlib.Path("../private/posts"),
+        help="Directory with the posts' private files.",
+    )
+    parsed_args = parser.parse_args(args)
+    counts = import_comments(
+        _messages(parsed_args),
+        posts_dir=parsed_args.posts_dir,
+        private_posts_dir=parsed_args.private_posts_dir,
+        report=lambda line: print(line, file=sys.stderr),
+    )
+    for post_id, count in sorted(counts.items()):
+        print(f"{post_id}: {count} new comments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from collections.abc import Generator
+import contextlib
+import datetime
+import email.message
+import email.utils
+import mailbox
+import pathlib
+import textwrap
+import time
+import tomllib
+import uuid
+
+import pytest
+
+from dseomn_website import comment_import
+from dseomn_website import comment_pack
+
+_POST_UUID = "67ed54bc-e214-4177-9846-2236de449037"
+_EXISTING_COMMENT_UUID = "096aa7f3-827a-4824-91f0-97da7cbd160b"
+
+
+@pytest.fixture(autouse=True)
+def _root_path(tmp_path: pathlib.Path) -> Generator[None, None, None]:
+    with contextlib.chdir(tmp_path):
+        pathlib.Path("public/posts/2025-06-27-foo").mkdir(parents=True)
+        pathlib.Path("public/posts/2025-06-27-foo/metadata.toml").write_text(
+            textwrap.dedent(
+                f"""\
+                uuid = "{_POST_UUID}"
+                published = 2025-06-27 14:15:01-04:00
+                title = "Foo"
+                comments = [
+                  "{_EXISTING_COMMENT_UUID}",
+                ]
+
+                [[media.items]]
+                type = "image"
+                """
+            )
+        )
+        comments_path = pathlib.Path("private/posts/2025-06-27-foo/comments")
+        comments_path.mkdir(parents=True)
+        (comments_path / f"{_EXISTING_COMMENT_UUID}.toml").write_text(
+            textwrap.dedent(
+                """\
+                published = 2025-07-02 16:15:35-04:00
+                author.name = "Someone Else"
+                """
+            )
+        )
+        (comments_path / f"{_EXISTING_COMMENT_UUID}.html").write_text(
+            "<p>kumquat</p>\n"
+        )
+        yield
+
+
+def _message(
+    *,
+    message_id: str,
+    to: str,
+    date: str = "Thu, 3 Jul 2025 15:56:21 -0400",
+    body: str,
+) -> email.message.EmailMessage:
+    message = email.message.EmailMessage()
+    message["From"] = "Someone <someone@example.com>"
+    message["To"] = to
+    message["Date"] = date
+    message["Message-ID"] = message_id
+    message["Subject"] = "Re: https://david.mandelberg.org/2025/06/27/foo/"
+    message.set_content(body)
+    return message
+
+
+def _write_mbox(*messages: email.message.EmailMessage) -> None:
+    mbox = mailbox.mbox("mbox")
+    for message in messages:
+        mbox.add(message)
+    mbox.close()
+
+
+def _main() -> None:
+    comment_import.main(
+        args=(
+            "--mbox=mbox",
+            "--posts-dir=public/posts",
+            "--private-posts-dir=private/posts",
+        )
+    )
+
+
+def _comment_uuids() -> list[str]:
+    comment_uuids: list[str] = tomllib.loads(
+        pathlib.Path("public/posts/2025-06-27-foo/metadata.toml").read_text()
+    )["comments"]
+    return comment_uuids
+
+
+def test_import() -> None:
+    _write_mbox(
+        _message(
+            message_id="<top-level@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body=textwrap.dedent(
+                """\
+                Name: Someone Else
+                URI (optional): https://example.com/
+
+                Comment:
+                First <paragraph>.
+
+                Second paragraph.
+
+                > Quoted.
+                """
+            ),
+        ),
+        _message(
+            message_id="<reply@example.com>",
+            to=f"david+website-reply-to-{_EXISTING_COMMENT_UUID}@mandelberg.org",
+            date="Thu, 3 Jul 2025 15:56:22 -0400",
+            body="Just a comment, with the name from the From header.\n",
+        ),
+        _message(
+            message_id="<unknown@example.com>",
+            to="david+website-reply-to-00000000-0000-0000-0000-000000000000"
+            "@mandelberg.org",
+            body="Reply to nothing.\n",
+        ),
+    )
+    top_level_uuid = uuid.uuid5(
+        comment_import._MESSAGE_ID_NAMESPACE,
+        "<top-level@example.com>",
+    )
+    reply_uuid = uuid.uuid5(
+        comment_import._MESSAGE_ID_NAMESPACE,
+        "<reply@example.com>",
+    )
+    comments_path = pathlib.Path("private/posts/2025-06-27-foo/comments")
+
+    _main()
+
+    assert _comment_uuids() == [
+        _EXISTING_COMMENT_UUID,
+        str(top_level_uuid),
+        str(reply_uuid),
+    ]
+    assert tomllib.loads(
+        (comments_path / f"{top_level_uuid}.toml").read_text()
+    ) == {
+        "published": "Thu, 03 Jul 2025 15:56:21 -0400",
+        "author": {"name": "Someone Else", "uri": "https://example.com/"},
+    }
+    assert (comments_path / f"{top_level_uuid}.html").read_text() == (
+        "<p>First &lt;paragraph&gt;.</p>\n<p>Second paragraph.</p>\n"
+    )
+    assert tomllib.loads(
+        (comments_path / f"{reply_uuid}.toml").read_text()
+    ) == {
+        "published": "Thu, 03 Jul 2025 15:56:22 -0400",
+        "author": {"name": "Someone"},
+        "in_reply_to": _EXISTING_COMMENT_UUID,
+    }
+    assert tomllib.loads(
+        pathlib.Path("public/posts/2025-06-27-foo/metadata.toml").read_text()
+    )["media"] == {"items": [{"type": "image"}]}
+
+
+def test_import_idempotent() -> None:
+    _write_mbox(
+        _message(
+            message_id="<top-level@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body="Comment.\n",
+        ),
+    )
+    _main()
+    metadata = pathlib.Path(
+        "public/posts/2025-06-27-foo/metadata.toml"
+    ).read_text()
+
+    _main()
+
+    assert (
+        pathlib.Path("public/posts/2025-06-27-foo/metadata.toml").read_text()
+        == metadata
+    )
+
+
+def test_import_no_existing_comments() -> None:
+    pathlib.Path("public/posts/2025-06-27-foo/metadata.toml").write_text(
+        textwrap.dedent(
+            f"""\
+            uuid = "{_POST_UUID}"
+            title = "Foo"
+
+            [media]
+            """
+        )
+    )
+    _write_mbox(
+        _message(
+            message_id="<top-level@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body="Comment.\n",
+        ),
+    )
+
+    comment_uuid = uuid.uuid5(
+        comment_import._MESSAGE_ID_NAMESPACE,
+        "<top-level@example.com>",
+    )
+
+    _main()
+
+    assert pathlib.Path(
+        "public/posts/2025-06-27-foo/metadata.toml"
+    ).read_text() == textwrap.dedent(
+        f"""\
+        uuid = "{_POST_UUID}"
+        title = "Foo"
+        comments = [
+          "{comment_uuid}",
+        ]
+
+        [media]
+        """
+    )
+
+
+def test_import_packed() -> None:
+    comment_pack.main(
+        args=(
+            "--metadata=public/posts/2025-06-27-foo/metadata.toml",
+            "--private-dir=private/posts/2025-06-27-foo",
+            "pack",
+        )
+    )
+    _write_mbox(
+        _message(
+            message_id="<top-level@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body="Comment.\n",
+        ),
+    )
+
+    _main()
+
+    assert not pathlib.Path("private/posts/2025-06-27-foo/comments").exists()
+    pack = comment_pack.loads(
+        pathlib.Path("private/posts/2025-06-27-foo/comments.pack").read_text()
+    )
+    assert list(map(uuid.UUID, _comment_uuids())) == [
+        uuid.UUID(_EXISTING_COMMENT_UUID),
+        uuid.uuid5(
+            comment_import._MESSAGE_ID_NAMESPACE,
+            "<top-level@example.com>",
+        ),
+    ]
+    assert pack.keys() == set(map(uuid.UUID, _comment_uuids()))
+
+
+def test_import_packed_unexpected_file() -> None:
+    comment_pack.main(
+        args=(
+            "--metadata=public/posts/2025-06-27-foo/metadata.toml",
+            "--private-dir=private/posts/2025-06-27-foo",
+            "pack",
+        )
+    )
+    pathlib.Path("private/posts/2025-06-27-foo/comments").mkdir()
+    pathlib.Path("private/posts/2025-06-27-foo/comments/stray").write_text("")
+    _write_mbox(
+        _message(
+            message_id="<top-level@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body="Comment.\n",
+        ),
+    )
+    metadata_path = pathlib.Path("public/posts/2025-06-27-foo/metadata.toml")
+    pack_path = pathlib.Path("private/posts/2025-06-27-foo/comments.pack")
+    metadata = metadata_path.read_text()
+    pack = pack_path.read_text()
+
+    with pytest.raises(ValueError, match="Unexpected files"):
+        _main()
+
+    assert metadata_path.read_text() == metadata
+    assert pack_path.read_text() == pack
+
+
+def test_import_no_text_plain_body(capsys: pytest.CaptureFixture[str]) -> None:
+    message = email.message.EmailMessage()
+    message["From"] = "Someone <someone@example.com>"
+    message["To"] = f"david+website-reply-to-{_POST_UUID}@mandelberg.org"
+    message["Date"] = "Thu, 3 Jul 2025 15:56:21 -0400"
+    message["Message-ID"] = "<html@example.com>"
+    message.set_content("<script></script>", subtype="html")
+    _write_mbox(message)
+
+    _main()
+
+    assert _comment_uuids() == [_EXISTING_COMMENT_UUID]
+    assert "No text/plain body" in capsys.readouterr().err
+
+
+def test_import_reply_not_after_parent(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    _write_mbox(
+        _message(
+            message_id="<reply@example.com>",
+            to=f"david+website-reply-to-{_EXISTING_COMMENT_UUID}@mandelberg.org",
+            date="Wed, 2 Jul 2025 16:15:35 -0400",
+            body="Reply from a skewed clock.\n",
+        ),
+    )
+
+    reply_uuid = uuid.uuid5(
+        comment_import._MESSAGE_ID_NAMESPACE,
+        "<reply@example.com>",
+    )
+    comments_path = pathlib.Path("private/posts/2025-06-27-foo/comments")
+
+    _main()
+
+    assert _comment_uuids() == [_EXISTING_COMMENT_UUID]
+    assert not (comments_path / f"{reply_uuid}.toml").exists()
+    assert "Date is not after" in capsys.readouterr().err
+
+
+def test_import_same_date() -> None:
+    _write_mbox(
+        _message(
+            message_id="<same-as-existing@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            date="Wed, 2 Jul 2025 20:15:35 +0000",
+            body="Comment.\n",
+        ),
+        _message(
+            message_id="<first@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body="Comment.\n",
+        ),
+        _message(
+            message_id="<same-as-first@example.com>",
+            to=f"david+website-reply-to-{_POST_UUID}@mandelberg.org",
+            body="Comment.\n",
+        ),
+    )
+
+    _main()
+
+    assert _comment_uuids() == [
+        _EXISTING_COMMENT_UUID,
+        *(
+            str(uuid.uuid5(comment_import._MESSAGE_ID_NAMESPACE, message_id))
+            for message_id in (
+                "<same-as-existing@example.com>",
+                "<first@example.com>",
+                "<same-as-first@example.com>",
+            )
+        ),
+    ]
+
+
+@pytest.mark.slow
+def test_import_many() -> None:
+    # This writes the mbox directly, since the mailbox module is much slower.
+    with open("mbox", "w") as mbox:
+        for i in range(10_000):
+            date = datetime.datetime(
+                2025, 7, 3, tzinfo=datetime.timezone.utc
+            ) + datetime.timedelta(seconds=i)
+            mbox.write(
+                textwrap.dedent(
+                    f"""\
+                    From someone@example.com Thu Jul  3 15:56:21 2025
+                    From: Someone <someone@example.com>
+                    To: david+website-reply-to-{_POST_UUID}@mandelberg.org
+                    Date: {email.utils.format_datetime(date)}
+                    Message-ID: <{i}@example.com>
+
+                    Comment {i}.
+
+                    """
+                )
+            )
+
+    start = time.perf_counter()
+    _main()
+    seconds = time.perf_counter() - start
+
+    assert len(_comment_uuids()) == 10_001
+    assert seconds < 30
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+"""Packs all comments on a post into a single file.
+
+Unpacked, each comment is a TOML file with its metadata and an HTML file with
+its contents, in the comments subdirectory of the post's private directory.
+Packed, they're all in comments.pack in the post's private directory, which
+adds only one dependency to each template that uses the comments, instead of
+two per comment. The format is a header line and then a JSON object that maps
+each comment's uuid to its metadata and contents. The metadata is stored as the
+original TOML, so converting between the formats is lossless. Templates read the
+whole file through ginjarator anyway, so there's no index for random access.
+
+The post's metadata.toml has comments_format = "pack" when its comments are
+packed.
+"""
+
+import argparse
+from collections.abc import Mapping, Sequence
+import dataclasses
+import json
+import pathlib
+import re
+import sys
+import tomllib
+import uuid
+
+_HEADER = "dseomn-website comment pack 2\n"
+_FORMAT_LINE = 'comments_format = "pack"\n'
+_COMMENTS_LINE = re.compile(r"^comments\s*=", flags=re.MULTILINE)
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class Entry:
+    metadata: str
+    contents: str
+
+
+def dumps(entries: Mapping[uuid.UUID, Entry]) -> str:
+    return _HEADER + json.dumps(
+        {
+            str(comment_uuid): {
+                "metadata": entry.metadata,
+                "contents": entry.contents,
+            }
+            for comment_uuid, entry in sorted(entries.items())
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def loads(pack: str) -> Mapping[uuid.UUID, Entry]:
+    if not pack.startswith(_HEADER):
+        raise ValueError(f"Not a comment pack: {pack[:len(_HEADER)]!r}")
+    return {
+        uuid.UUID(comment_uuid): Entry(
+            metadata=entry["metadata"],
+            contents=entry["contents"],
+        )
+        for comment_uuid, entry in json.loads(pack[len(_HEADER) :]).items()
+    }
+
+
+def _pack(args: argparse.Namespace) -> None:
+    metadata = args.metadata.read_text()
+    if not _COMMENTS_LINE.search(metadata):
+        raise ValueError(f"{args.metadata} has no comments to pack.")
+    if _FORMAT_LINE in metadata:
+        raise ValueError(f"{args.metadata} is already packed.")
+    comments_dir = args.private_dir / "comments"
+    comment_uuids = tuple(
+        map(uuid.UUID, tomllib.loads(metadata).get("comments", []))
+    )
+    comment_paths = {
+        comments_dir / f"{comment_uuid}.{suffix}"
+        for comment_uuid in comment_uuids
+        for suffix in ("toml", "html")
+    }
+    if unlisted := set(comments_dir.iterdir()) - comment_paths:
+        raise ValueError(
+            f"Files in {comments_dir} that aren't listed in {args.metadata}: "
+            f"{sorted(map(str, unlisted))}"
+        )
+    entries = {
+        comment_uuid: Entry(
+            metadata=(comments_dir / f"{comment_uuid}.toml").read_text(),
+            contents=(comments_dir / f"{comment_uuid}.html").read_text(),
+        )
+        for comment_uuid in comment_uuids
+    }
+    (args.private_dir / "comments.pack").write_text(dumps(entries))
+    args.metadata.write_text(
+        _COMMENTS_LINE.sub(
+            lambda match: _FORMAT_LINE + match[0],
+            metadata,
+            count=1,
+        )
+    )
+    for path in comment_paths:
+        path.unlink()
+    comments_dir.rmdir()
+
+
+def _unpack(args: argparse.Namespace) -> None:
+    metadata = args.metadata.read_text()
+    if _FORMAT_LINE not in metadata:
+        raise ValueError(f"{args.metadata} is not packed.")
+    pack_path = args.private_dir / "comments.pack"
+    comments_dir = args.private_dir / "comments"
+    comments_dir.mkdir()
+    for comment_uuid, entry in loads(pack_path.read_text()).items():
+        (comments_dir / f"{comment_uuid}.toml").write_text(entry.metadata)
+        (comments_dir / f"{comment_uuid}.html").write_text(entry.contents)
+    args.metadata.write_text(metadata.replace(_FORMAT_LINE, "", 1))
+    pack_path.unlink()
+
+
+def main(
+    *,
+    args: Sequence[str] = sys.argv[1:],
+) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--metadata",
+        type=pathlib.Path,
+        required=True,
+        help="The post's metadata.toml file.",
+    )
+    parser.add_argument(
+        "--private-dir",
+        type=pathlib.Path,
+        required=True,
+        help="The post's private directory, e.g., ../private/posts/<id>.",
+    )
+    parser.set_defaults(subcommand=lambda args: parser.print_help())
+    subparsers = parser.add_subparsers()
+
+    pack_parser = subparsers.add_parser(
+        "pack",
+        help="Convert separate comment files to a pack.",
+    )
+    pack_parser.set_defaults(subcommand=_pack)
+
+    unpack_parser = subparsers.add_parser(
+        "unpack",
+        help="Convert a pack to separate comment files.",
+    )
+    unpack_parser.set_defaults(subcommand=_unpack)
+
+    parsed_args = parser.parse_args(args)
+    parsed_args.subcommand(parsed_args)
+
+
+if __name__ == "__main__":
+    main()
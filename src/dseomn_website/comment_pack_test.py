@@ -0,0 +1,164 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from collections.abc import Generator
+import contextlib
+import pathlib
+import textwrap
+import uuid
+
+import pytest
+
+from dseomn_website import comment_pack
+
+
+@pytest.fixture(autouse=True)
+def _root_path(tmp_path: pathlib.Path) -> Generator[None, None, None]:
+    with contextlib.chdir(tmp_path):
+        yield
+
+
+def test_dumps_loads() -> None:
+    entries = {
+        uuid.UUID("096aa7f3-827a-4824-91f0-97da7cbd160b"): comment_pack.Entry(
+            metadata='author.name = "Someone Else"\n',
+            contents="<p>Ünïcödé\n\ncontents</p>\n",
+        ),
+        uuid.UUID("131294af-bba3-4296-a7e8-1f2eb5ca741c"): comment_pack.Entry(
+            metadata="",
+            contents="",
+        ),
+    }
+
+    assert comment_pack.loads(comment_pack.dumps(entries)) == entries
+
+
+def test_loads_error() -> None:
+    with pytest.raises(ValueError, match="Not a comment pack"):
+        comment_pack.loads("{}\n")
+
+
+def _write_unpacked() -> dict[str, str]:
+    files = {
+        "public/metadata.toml": textwrap.dedent(
+            """\
+            title = "Foo"
+            comments = [
+                "096aa7f3-827a-4824-91f0-97da7cbd160b",
+                "131294af-bba3-4296-a7e8-1f2eb5ca741c",
+            ]
+
+            [media]
+            """
+        ),
+        "private/comments/096aa7f3-827a-4824-91f0-97da7cbd160b.toml": (
+            'author.name = "Someone Else"\n'
+        ),
+        "private/comments/096aa7f3-827a-4824-91f0-97da7cbd160b.html": (
+            "<p>Ünïcödé</p>\n"
+        ),
+        "private/comments/131294af-bba3-4296-a7e8-1f2eb5ca741c.toml": (
+            'author.name = "David Mandelberg"\n'
+        ),
+        "private/comments/131294af-bba3-4296-a7e8-1f2eb5ca741c.html": (
+            "<p>bar</p>\n"
+        ),
+    }
+    for name, contents in files.items():
+        path = pathlib.Path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(contents)
+    return files
+
+
+def _files() -> dict[str, str]:
+    return {
+        str(path): path.read_text()
+        for path in pathlib.Path().glob("**/*")
+        if path.is_file()
+    }
+
+
+def test_main_pack_unpack() -> None:
+    unpacked = _write_unpacked()
+    args = ("--metadata=public/metadata.toml", "--private-dir=private")
+
+    comment_pack.main(args=(*args, "pack"))
+
+    assert _files().keys() == {
+        "public/metadata.toml",
+        "private/comments.pack",
+    }
+    assert pathlib.Path("public/metadata.toml").read_text() == (
+        unpacked["public/metadata.toml"].replace(
+            "comments = [",
+            'comments_format = "pack"\ncomments = [',
+        )
+    )
+    assert comment_pack.loads(
+        pathlib.Path("private/comments.pack").read_text()
+    ) == {
+        uuid.UUID("096aa7f3-827a-4824-91f0-97da7cbd160b"): comment_pack.Entry(
+            metadata='author.name = "Someone Else"\n',
+            contents="<p>Ünïcödé</p>\n",
+        ),
+        uuid.UUID("131294af-bba3-4296-a7e8-1f2eb5ca741c"): comment_pack.Entry(
+            metadata='author.name = "David Mandelberg"\n',
+            contents="<p>bar</p>\n",
+        ),
+    }
+
+    comment_pack.main(args=(*args, "unpack"))
+
+    assert _files() == unpacked
+
+
+def test_main_pack_unlisted_file() -> None:
+    _write_unpacked()
+    pathlib.Path(
+        "private/comments/3ca3cd03-5c6d-4a1c-8b6b-c9a2e61e7e67.toml"
+    ).write_text('author.name = "Half Written"\n')
+    before = _files()
+
+    with pytest.raises(ValueError, match="aren't listed"):
+        comment_pack.main(
+            args=(
+                "--metadata=public/metadata.toml",
+                "--private-dir=private",
+                "pack",
+            )
+        )
+
+    assert _files() == before
+
+
+def test_main_pack_no_comments() -> None:
+    pathlib.Path("metadata.toml").write_text('title = "Foo"\n')
+
+    with pytest.raises(ValueError, match="no comments"):
+        comment_pack.main(
+            args=("--metadata=metadata.toml", "--private-dir=.", "pack")
+        )
+
+
+def test_main_pack_already_packed() -> None:
+    _write_unpacked()
+    args = ("--metadata=public/metadata.toml", "--private-dir=private")
+    comment_pack.main(args=(*args, "pack"))
+
+    with pytest.raises(ValueError, match="already packed"):
+        comment_pack.main(args=(*args, "pack"))
+
+
+def test_main_unpack_not_packed() -> None:
+    _write_unpacked()
+
+    with pytest.raises(ValueError, match="not packed"):
+        comment_pack.main(
+            args=(
+                "--metadata=public/metadata.toml",
+                "--private-dir=private",
+                "unpack",
+            )
+        )
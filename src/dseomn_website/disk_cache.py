@@ -0,0 +1,159 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+"""Persistent memoization across builds.
+
+The cache is not read through ginjarator's filesystem API, so it doesn't add
+dependencies. That's only correct for values that are pure functions of their
+keys, so keys must include everything that could affect the value, e.g., the
+input and the version of the code that computes the value.
+"""
+
+import functools
+import pathlib
+import sqlite3
+import time
+
+from dseomn_website import paths
+
+
+class DiskCache:
+    """Key-value store with least-recently-used eviction by total size."""
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        *,
+        max_size: int,
+        last_used_resolution_ns: int = 60 * 60 * 1_000_000_000,
+    ) -> None:
+        """Initializer.
+
+        Args:
+            path: SQLite database to store the cache in.
+            max_size: Maximum total size of values, in bytes.
+            last_used_resolution_ns: How old an entry's last use must be before
+                get() records a new one. Eviction only needs rough recency, and
+                this keeps most cache hits from needing the write lock.
+        """
+        self._max_size = max_size
+        self._last_used_resolution_ns = last_used_resolution_ns
+        # Many ginjarator templates can render in parallel, so this uses WAL
+        # mode and a generous timeout instead of failing when another process
+        # holds the lock.
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key BLOB PRIMARY KEY NOT NULL,
+                    value BLOB NOT NULL,
+                    last_used INTEGER NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE INDEX IF NOT EXISTS entries_by_last_used
+                ON entries (last_used)
+                """
+            )
+            # The total size of all values, so that set() doesn't need to scan
+            # every entry.
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    id INTEGER PRIMARY KEY NOT NULL CHECK (id = 0),
+                    total_size INTEGER NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                INSERT OR IGNORE INTO meta
+                SELECT 0, COALESCE(SUM(LENGTH(value)), 0) FROM entries
+                """
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def get(self, key: bytes) -> bytes | None:
+        """Returns the value for key, or None if it's not in the cache."""
+        row = self._connection.execute(
+            "SELECT value, last_used FROM entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        value, last_used = row
+        now = time.time_ns()
+        if now - last_used >= self._last_used_resolution_ns:
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    (now, key),
+                )
+        return bytes(value)
+
+    def set(self, key: bytes, value: bytes) -> None:
+        """Sets the value for key, then evicts entries if needed."""
+        with self._connection:
+            # This starts with a write, so the transaction takes the write lock
+            # right away instead of failing to upgrade from a read later.
+            size_change = len(value) - sum(
+                old_size
+                for (old_size,) in self._connection.execute(
+                    "DELETE FROM entries WHERE key = ? RETURNING LENGTH(value)",
+                    (key,),
+                ).fetchall()
+            )
+            self._connection.execute(
+                "INSERT INTO entries VALUES (?, ?, ?)",
+                (key, value, time.time_ns()),
+            )
+            (size,) = self._connection.execute(
+                """
+                UPDATE meta SET total_size = total_size + ?
+                RETURNING total_size
+                """,
+                (size_change,),
+            ).fetchone()
+            while size > self._max_size:
+                (evicted_size,) = self._connection.execute(
+                    """
+                    DELETE FROM entries
+                    WHERE key = (
+                        SELECT key FROM entries ORDER BY last_used LIMIT 1
+                    )
+                    RETURNING LENGTH(value)
+                    """
+                ).fetchone()
+                size -= evicted_size
+            self._connection.execute(
+                "UPDATE meta SET total_size = ?",
+                (size,),
+            )
+
+
+@functools.cache
+def in_work(
+    name: str,
+    *,
+    max_size: int,
+    root: pathlib.Path,
+) -> DiskCache | None:
+    """Returns a cache in the work directory, or None if it doesn't exist yet.
+
+    Args:
+        name: Filename of the cache.
+        max_size: See DiskCache.
+        root: Root directory of the project, i.e., ginjarator's fs.root. This
+            is required so that every cache is found the same way, regardless
+            of the current directory.
+    """
+    work_path = root / paths.WORK
+    if not work_path.is_dir():
+        return None
+    return DiskCache(work_path / name, max_size=max_size)
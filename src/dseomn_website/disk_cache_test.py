@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from collections.abc import Generator
+import contextlib
+import pathlib
+
+import pytest
+
+from dseomn_website import disk_cache
+
+
+@pytest.fixture(autouse=True)
+def _root_path(tmp_path: pathlib.Path) -> Generator[None, None, None]:
+    with contextlib.chdir(tmp_path):
+        yield
+
+
+@contextlib.contextmanager
+def _cache(
+    *,
+    max_size: int = 1024,
+    last_used_resolution_ns: int = 0,
+) -> Generator[disk_cache.DiskCache, None, None]:
+    cache = disk_cache.DiskCache(
+        pathlib.Path("cache.sqlite3"),
+        max_size=max_size,
+        last_used_resolution_ns=last_used_resolution_ns,
+    )
+    try:
+        yield cache
+    finally:
+        cache.close()
+
+
+def test_get_missing() -> None:
+    with _cache() as cache:
+        assert cache.get(b"key") is None
+
+
+def test_persistent() -> None:
+    with _cache() as cache:
+        cache.set(b"key", b"value")
+        cache.set(b"key", b"new-value")
+
+    with _cache() as cache:
+        assert cache.get(b"key") == b"new-value"
+
+
+def test_eviction() -> None:
+    with _cache(max_size=8) as cache:
+        cache.set(b"a", b"1234")
+        cache.set(b"b", b"1234")
+        cache.get(b"a")
+        cache.set(b"c", b"1234")
+
+        assert cache.get(b"a") == b"1234"
+        assert cache.get(b"b") is None
+        assert cache.get(b"c") == b"1234"
+
+
+def test_eviction_after_reopen() -> None:
+    with _cache(max_size=8) as cache:
+        cache.set(b"a", b"1234")
+        cache.set(b"b", b"1234")
+        cache.set(b"a", b"5678")
+
+    with _cache(max_size=8) as cache:
+        cache.set(b"c", b"1234")
+
+        assert cache.get(b"a") == b"5678"
+        assert cache.get(b"b") is None
+        assert cache.get(b"c") == b"1234"
+
+
+def test_eviction_of_new_value_larger_than_max_size() -> None:
+    with _cache(max_size=8) as cache:
+        cache.set(b"a", b"1234")
+        cache.set(b"b", b"123456789")
+        cache.set(b"c", b"1234")
+
+        assert cache.get(b"a") is None
+        assert cache.get(b"b") is None
+        assert cache.get(b"c") == b"1234"
+
+
+def test_get_recently_used_does_not_write() -> None:
+    with _cache(last_used_resolution_ns=60 * 1_000_000_000) as cache:
+        cache.set(b"key", b"value")
+        total_changes = cache._connection.total_changes
+
+        assert cache.get(b"key") == b"value"
+        assert cache._connection.total_changes == total_changes
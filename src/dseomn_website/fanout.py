@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+"""Reports how many pages depend on each input file.
+
+This follows the build edges in ninja's graph, from `ninja -t query`, plus the
+dependencies that ginjarator records in ninja's deps log, from `ninja -t deps`.
+The deps log only knows about outputs that have been built at least once.
+Dependencies are followed transitively, so if a template reads a file that
+another template wrote, the first template's outputs count as depending on
+everything the second one read. Only outputs that match --page are counted.
+
+Examples:
+    Show the inputs with the most dependents:
+        src/dseomn_website/fanout.py --exclude='src/*' --exclude='include/*'
+    Save the current counts, and later fail if any of them increased:
+        src/dseomn_website/fanout.py --write-baseline=fanout.json
+        src/dseomn_website/fanout.py --baseline=fanout.json
+"""
+
+import argparse
+from collections.abc import Callable, Collection, Mapping, Sequence
+import fnmatch
+import json
+import pathlib
+import subprocess
+import sys
+
+_DEPS_SEPARATOR = ": #deps "
+# Maximum number of targets to pass to one `ninja -t query` command.
+_QUERY_BATCH_SIZE = 1000
+
+
+def parse_deps(deps: str) -> Mapping[str, Collection[str]]:
+    """Parses the output of `ninja -t deps`.
+
+    Returns:
+        Map from each output to its inputs.
+    """
+    result = dict[str, list[str]]()
+    inputs = None
+    for line in deps.splitlines():
+        if not line.strip():
+            continue
+        elif line[0].isspace():
+            if inputs is None:
+                raise ValueError(f"Input without an output: {line!r}")
+            inputs.append(line.strip())
+        elif _DEPS_SEPARATOR in line:
+            inputs = result.setdefault(
+                line[: line.rindex(_DEPS_SEPARATOR)],
+                [],
+            )
+        else:
+            raise ValueError(f"Unexpected line: {line!r}")
+    return {output: frozenset(inputs) for output, inputs in result.items()}
+
+
+def parse_query(query: str) -> Mapping[str, Collection[str]]:
+    """Parses the output of `ninja -t query`.
+
+    Order-only inputs are ignored, since changing them doesn't rebuild anything.
+
+    Returns:
+        Map from each output to the inputs of the build edge that produces it.
+    """
+    result = dict[str, list[str]]()
+    target = None
+    inputs = None
+    for line in query.splitlines():
+        if not line.strip():
+            continue
+        elif not line[0].isspace():
+            if not line.endswith(":"):
+                raise ValueError(f"Unexpected line: {line!r}")
+            target = line[:-1]
+            inputs = None
+        elif line.startswith("    "):
+            if target is None:
+                raise ValueError(f"Item without a target: {line!r}")
+            item = line.strip()
+            if inputs is None or item.startswith("|| "):
+                continue
+            inputs.append(item.removeprefix("| "))
+        elif line.strip().startswith("input: "):
+            if target is None:
+                raise ValueError(f"Input without a target: {line!r}")
+            inputs = result.setdefault(target, [])
+        else:
+            # Another section, e.g., outputs or validations.
+            inputs = None
+    return {output: frozenset(inputs) for output, inputs in result.items()}
+
+
+def fanout(
+    *graphs: Mapping[str, Collection[str]],
+    is_page: Callable[[str], bool],
+) -> Mapping[str, int]:
+    """Returns the number of pages that depend on each input.
+
+    Args:
+        *graphs: Maps from each output to its inputs, e.g., from parse_deps()
+            and parse_query().
+        is_page: Whether an output is a page to count.
+    """
+    dependents = dict[str, set[str]]()
+    for graph in graphs:
+        for output, inputs in graph.items():
+            for input_ in inputs:
+                dependents.setdefault(input_, set()).add(output)
+    result = {}
+    for input_ in dependents:
+        seen = set[str]()
+        stack = [input_]
+        while stack:
+            for output in dependents.get(stack.pop(), ()):
+                if output not in seen:
+                    seen.add(output)
+                    stack.append(output)
+        result[input_] = sum(map(is_page, seen))
+    return result
+
+
+def _ninja(*args: str) -> str:
+    return subprocess.run(
+        ("ninja", *args),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def _read_deps(args: argparse.Namespace) -> str:
+    if args.deps is not None:
+        deps: str = args.deps.read_text()
+        return deps
+    return _ninja("-t", "deps")
+
+
+def _read_query(args: argparse.Namespace) -> str:
+    if args.query is not None:
+        query: str = args.query.read_text()
+        return query
+    targets = [
+        line.rpartition(": ")[0]
+        for line in _ninja("-t", "targets", "all").splitlines()
+        if line
+    ]
+    return "".join(
+        _ninja("-t", "query", *targets[start : start + _QUERY_BATCH_SIZE])
+        for start in range(0, len(targets), _QUERY_BATCH_SIZE)
+    )
+
+
+def main(
+    *,
+    args: Sequence[str] = sys.argv[1:],
+) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--deps",
+        type=pathlib.Path,
+        help="Output of `ninja -t deps` to read, instead of running ninja.",
+    )
+    parser.add_argument(
+        "--query",
+        type=pathlib.Path,
+        help=(
+            "Output of `ninja -t query` for all targets to read, instead of "
+            "running ninja."
+        ),
+    )
+    parser.add_argument(
+        "--page",
+        action="append",
+        help="Glob of outputs to count as pages. Default: output/*",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="Glob of inputs to ignore, e.g., code that everything uses.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Number of inputs to show.",
+    )
+    parser.add_argument(
+        "--max-fanout",
+        type=int,
+        help="Fail if any input has more dependent pages than this.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=pathlib.Path,
+        help=(
+            "Fail if any input has more dependent pages than in this file. "
+            "Inputs that aren't in the file count as having none."
+        ),
+    )
+    parser.add_argument(
+        "--write-baseline",
+        type=pathlib.Path,
+        help="Write the counts to this file, for use with --baseline.",
+    )
+    parsed_args = parser.parse_args(args)
+    page_patterns = parsed_args.page or ["output/*"]
+
+    counts = {
+        input_: count
+        for input_, count in fanout(
+            parse_query(_read_query(parsed_args)),
+            parse_deps(_read_deps(parsed_args)),
+            is_page=lambda output: any(
+                fnmatch.fnmatchcase(output, pattern)
+                for pattern in page_patterns
+            ),
+        ).items()
+        if not any(
+            fnmatch.fnmatchcase(input_, pattern)
+            for pattern in parsed_args.exclude
+        )
+    }
+    by_count = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    for input_, count in by_count[: parsed_args.top]:
+        print(f"{count}\t{input_}")
+
+    if parsed_args.write_baseline is not None:
+        parsed_args.write_baseline.write_text(
+            json.dumps(dict(sorted(counts.items())), indent=2) + "\n"
+        )
+
+    errors = list[str]()
+    if parsed_args.max_fanout is not None:
+        errors.extend(
+            f"{input_} has {count} dependent pages, more than "
+            f"{parsed_args.max_fanout}"
+            for input_, count in by_count
+            if count > parsed_args.max_fanout
+        )
+    if parsed_args.baseline is not None:
+        baseline = json.loads(parsed_args.baseline.read_text())
+        errors.extend(
+            f"{input_} has {count} dependent pages, up from "
+            f"{baseline.get(input_, 0)}"
+            for input_, count in by_count
+            if count > baseline.get(input_, 0)
+        )
+    if errors:
+        raise ValueError("High fan-out:\n" + "\n".join(errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from collections.abc import Generator, Mapping, Sequence
+import contextlib
+import json
+import pathlib
+import textwrap
+
+import pytest
+
+from dseomn_website import fanout
+
+# Each template's render edge has a stamp as its first output, and the files the
+# template writes as implicit outputs. Ninja records the discovered dependencies
+# under every output of an edge.
+_RENDER_STAMP = ".ginjarator/templates/{}/render-stamp"
+_FOO_STAMP = _RENDER_STAMP.format("posts/foo/index.html.jinja")
+_BAR_STAMP = _RENDER_STAMP.format("posts/bar/index.html.jinja")
+_MAIN_STAMP = _RENDER_STAMP.format("lists/main.html.jinja")
+_FOO_OUTPUTS = (
+    _FOO_STAMP,
+    "work/posts/foo/listing.json",
+    "output/2025/06/27/foo/index.html",
+)
+_BAR_OUTPUTS = (
+    _BAR_STAMP,
+    "work/posts/bar/listing.json",
+    "output/2025/06/28/bar/index.html",
+)
+_MAIN_OUTPUTS = (
+    _MAIN_STAMP,
+    "output/index.html",
+)
+_FOO_DEPS = (
+    "include/article.html.jinja",
+    "posts/foo/metadata.toml",
+    "src/dseomn_website/metadata.py",
+)
+_BAR_DEPS = (
+    "posts/bar/metadata.toml",
+    "src/dseomn_website/metadata.py",
+)
+_MAIN_DEPS = (
+    "src/dseomn_website/metadata.py",
+    "work/posts/bar/listing.json",
+    "work/posts/foo/listing.json",
+)
+
+
+def _deps_entries(
+    outputs: Sequence[str],
+    inputs: Sequence[str],
+) -> Generator[str, None, None]:
+    for output in outputs:
+        yield (
+            f"{output}: #deps {len(inputs)}, deps mtime 1751571381 (VALID)\n"
+        )
+        yield from (f"    {input_}\n" for input_ in inputs)
+        yield "\n"
+
+
+_DEPS = "".join(
+    (
+        *_deps_entries(_FOO_OUTPUTS, _FOO_DEPS),
+        *_deps_entries(_BAR_OUTPUTS, _BAR_DEPS),
+        *_deps_entries(_MAIN_OUTPUTS, _MAIN_DEPS),
+    )
+)
+
+
+def _query_entries(
+    outputs: Sequence[str],
+    template: str,
+    consumers: Mapping[str, Sequence[str]],
+) -> Generator[str, None, None]:
+    for output in outputs:
+        yield textwrap.dedent(
+            f"""\
+            {output}:
+              input: ginjarator_render
+                {template}
+                | ginjarator.toml
+                || .ginjarator/templates/{template}/dyndep
+              outputs:
+            """
+        )
+        yield from (
+            f"    {consumer}\n" for consumer in consumers.get(output, ())
+        )
+
+
+_QUERY = "".join(
+    (
+        *_query_entries(
+            _FOO_OUTPUTS,
+            "posts/foo/index.html.jinja",
+            {},
+        ),
+        *_query_entries(
+            _BAR_OUTPUTS,
+            "posts/bar/index.html.jinja",
+            {},
+        ),
+        *_query_entries(
+            _MAIN_OUTPUTS,
+            "lists/main.html.jinja",
+            {"output/index.html": ("output/index.html.br",)},
+        ),
+        textwrap.dedent(
+            """\
+            output/index.html.br:
+              input: compress
+                output/index.html
+              outputs:
+            """
+        ),
+    )
+)
+
+
+@pytest.fixture(autouse=True)
+def _root_path(tmp_path: pathlib.Path) -> Generator[None, None, None]:
+    with contextlib.chdir(tmp_path):
+        pathlib.Path("deps").write_text(_DEPS)
+        pathlib.Path("query").write_text(_QUERY)
+        yield
+
+
+def test_parse_deps() -> None:
+    assert fanout.parse_deps(_DEPS) == {
+        **{output: set(_FOO_DEPS) for output in _FOO_OUTPUTS},
+        **{output: set(_BAR_DEPS) for output in _BAR_OUTPUTS},
+        **{output: set(_MAIN_DEPS) for output in _MAIN_OUTPUTS},
+    }
+
+
+@pytest.mark.parametrize(
+    "deps",
+    (
+        "    orphan\n",
+        "not a deps line\n",
+    ),
+)
+def test_parse_deps_error(deps: str) -> None:
+    with pytest.raises(ValueError):
+        fanout.parse_deps(deps)
+
+
+def test_parse_query() -> None:
+    def render_inputs(template: str) -> set[str]:
+        return {template, "ginjarator.toml"}
+
+    assert fanout.parse_query(_QUERY) == {
+        **{
+            output: render_inputs("posts/foo/index.html.jinja")
+            for output in _FOO_OUTPUTS
+        },
+        **{
+            output: render_inputs("posts/bar/index.html.jinja")
+            for output in _BAR_OUTPUTS
+        },
+        **{
+            output: render_inputs("lists/main.html.jinja")
+            for output in _MAIN_OUTPUTS
+        },
+        "output/index.html.br": {"output/index.html"},
+    }
+
+
+def test_parse_query_source() -> None:
+    assert not fanout.parse_query("posts/foo/index.html.jinja:\n  outputs:\n")
+
+
+@pytest.mark.parametrize(
+    "query",
+    (
+        "    orphan\n",
+        "  input: phony\n",
+        "not a query line\n",
+    ),
+)
+def test_parse_query_error(query: str) -> None:
+    with pytest.raises(ValueError):
+        fanout.parse_query(query)
+
+
+def test_fanout() -> None:
+    assert fanout.fanout(
+        fanout.parse_query(_QUERY),
+        fanout.parse_deps(_DEPS),
+        is_page=lambda output: output.startswith("output/"),
+    ) == {
+        "include/article.html.jinja": 3,
+        "lists/main.html.jinja": 2,
+        "output/index.html": 1,
+        "posts/bar/index.html.jinja": 3,
+        "posts/bar/metadata.toml": 3,
+        "posts/foo/index.html.jinja": 3,
+        "posts/foo/metadata.toml": 3,
+        "ginjarator.toml": 4,
+        "src/dseomn_website/metadata.py": 4,
+        "work/posts/bar/listing.json": 2,
+        "work/posts/foo/listing.json": 2,
+    }
+
+
+def test_main(capsys: pytest.CaptureFixture[str]) -> None:
+    fanout.main(
+        args=(
+            "--deps=deps",
+            "--query=query",
+            "--exclude=ginjarator.toml",
+            "--exclude=src/*",
+            "--top=2",
+        )
+    )
+
+    assert capsys.readouterr().out == (
+        "3\tinclude/article.html.jinja\n3\tposts/bar/index.html.jinja\n"
+    )
+
+
+def test_main_page(capsys: pytest.CaptureFixture[str]) -> None:
+    fanout.main(
+        args=(
+            "--deps=deps",
+            "--query=query",
+            "--page=output/*.br",
+            "--exclude=ginjarator.toml",
+            "--exclude=src/*",
+            "--top=1",
+        )
+    )
+
+    assert capsys.readouterr().out == "1\tinclude/article.html.jinja\n"
+
+
+def test_main_max_fanout() -> None:
+    with pytest.raises(ValueError, match=r"metadata\.py has 4 dependent pages"):
+        fanout.main(args=("--deps=deps", "--query=query", "--max-fanout=3"))
+
+
+def test_main_baseline() -> None:
+    fanout.main(
+        args=("--deps=deps", "--query=query", "--write-baseline=baseline.json")
+    )
+    baseline = json.loads(pathlib.Path("baseline.json").read_text())
+    fanout.main(
+        args=("--deps=deps", "--query=query", "--baseline=baseline.json")
+    )
+    baseline["posts/foo/metadata.toml"] = 1
+    pathlib.Path("baseline.json").write_text(json.dumps(baseline))
+
+    with pytest.raises(ValueError, match=r"foo/metadata\.toml .* up from 1"):
+        fanout.main(
+            args=("--deps=deps", "--query=query", "--baseline=baseline.json")
+        )
+
+
+def test_main_baseline_new_input() -> None:
+    fanout.main(
+        args=("--deps=deps", "--query=query", "--write-baseline=baseline.json")
+    )
+    baseline = json.loads(pathlib.Path("baseline.json").read_text())
+    del baseline["posts/foo/metadata.toml"]
+    pathlib.Path("baseline.json").write_text(json.dumps(baseline))
+
+    with pytest.raises(ValueError, match=r"foo/metadata\.toml .* up from 0"):
+        fanout.main(
+            args=("--deps=deps", "--query=query", "--baseline=baseline.json")
+        )
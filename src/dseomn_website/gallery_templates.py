@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+"""Generates the templates that write gallery item details pages.
+
+Each page with gallery items has a gallery.html.jinja next to its
+index.html.jinja, so that editing the page's text doesn't re-render all its
+details pages. ginjarator's list of templates is static, so this writes those
+templates and their entries in ginjarator.toml from the pages' metadata.toml
+files, and removes them from pages that no longer have gallery items.
+
+Examples:
+    Update the templates after adding or removing gallery items:
+        src/dseomn_website/gallery_templates.py
+    Fail if any templates are out of date:
+        src/dseomn_website/gallery_templates.py --check
+"""
+
+import argparse
+from collections.abc import Sequence
+import json
+import pathlib
+import re
+import sys
+import tomllib
+
+_CONFIG = "ginjarator.toml"
+_PAGE_TEMPLATE_NAME = "index.html.jinja"
+_GALLERY_TEMPLATE_NAME = "gallery.html.jinja"
+_TEMPLATES = re.compile(
+    r"^templates = \[\n.*?^\]\n",
+    flags=re.MULTILINE | re.DOTALL,
+)
+
+# REUSE-IgnoreStart
+_GALLERY_TEMPLATE = """\
+{#
+ # SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+ #
+ # SPDX-License-Identifier: CC-BY-4.0
+ #}
+
+{% import "include/media_html.html.jinja" as media_html %}
+
+{{ media_html.gallery_details() }}
+"""
+# REUSE-IgnoreEnd
+
+
+def _has_gallery(root: pathlib.Path, page_template: pathlib.PurePath) -> bool:
+    metadata_path = root / page_template.with_name("metadata.toml")
+    if not metadata_path.exists():
+        return False
+    raw = tomllib.loads(metadata_path.read_text())
+    return any(
+        "gallery" in item_raw
+        for item_raw in raw.get("media", {}).get("items", ())
+    )
+
+
+def _templates(root: pathlib.Path, config: str) -> Sequence[pathlib.PurePath]:
+    """Returns the templates to list, with gallery templates before pages."""
+    result = list[pathlib.PurePath]()
+    for template_str in tomllib.loads(config)["templates"]:
+        template = pathlib.PurePath(template_str)
+        if template.name == _GALLERY_TEMPLATE_NAME:
+            continue
+        if template.name == _PAGE_TEMPLATE_NAME and _has_gallery(
+            root, template
+        ):
+            result.append(template.with_name(_GALLERY_TEMPLATE_NAME))
+        result.append(template)
+    return tuple(result)
+
+
+def main(
+    *,
+    args: Sequence[str] = sys.argv[1:],
+) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--root",
+        type=pathlib.Path,
+        default=pathlib.Path("."),
+        help=f"Directory with {_CONFIG}.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Fail instead of changing anything.",
+    )
+    parsed_args = parser.parse_args(args)
+    root = parsed_args.root
+
+    config_path = root / _CONFIG
+    config = config_path.read_text()
+    old_gallery_templates = {
+        pathlib.PurePath(template)
+        for template in tomllib.loads(config)["templates"]
+        if pathlib.PurePath(template).name == _GALLERY_TEMPLATE_NAME
+    }
+    templates = _templates(root, config)
+    gallery_templates = {
+        template
+        for template in templates
+        if template.name == _GALLERY_TEMPLATE_NAME
+    }
+    new_config, substitutions = _TEMPLATES.subn(
+        lambda match: "".join(
+            (
+                "templates = [\n",
+                *(
+                    f"  {json.dumps(str(template))},\n"
+                    for template in templates
+                ),
+                "]\n",
+            )
+        ),
+        config,
+        count=1,
+    )
+    if not substitutions:
+        raise ValueError(f"{str(config_path)!r} has no templates list.")
+    to_write = {
+        template
+        for template in gallery_templates
+        if not (root / template).exists()
+        or (root / template).read_text() != _GALLERY_TEMPLATE
+    }
+    to_remove = old_gallery_templates - gallery_templates
+
+    if parsed_args.check:
+        if new_config != config or to_write or to_remove:
+            raise ValueError(
+                "Gallery templates are out of date, run "
+                "src/dseomn_website/gallery_templates.py to update them."
+            )
+        return
+    for template in sorted(to_write):
+        (root / template).write_text(_GALLERY_TEMPLATE)
+    for template in sorted(to_remove):
+        (root / template).unlink(missing_ok=True)
+    config_path.write_text(new_config)
+
+
+if __name__ == "__main__":
+    main()
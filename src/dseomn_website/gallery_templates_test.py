@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pathlib
+import textwrap
+
+import pytest
+
+from dseomn_website import gallery_templates
+
+
+def _write_page(root: pathlib.Path, page: str, *, gallery: bool) -> None:
+    (root / page).mkdir(parents=True)
+    (root / page / "index.html.jinja").write_text("")
+    (root / page / "metadata.toml").write_text(
+        textwrap.dedent(
+            f"""\
+            [[media.items]]
+            type = "image"
+            source = "foo.jpg"
+            {'gallery = "main"' if gallery else ""}
+            """
+        )
+    )
+
+
+def test_check_repo() -> None:
+    gallery_templates.main(args=("--check",))
+
+
+def test_update(tmp_path: pathlib.Path) -> None:
+    _write_page(tmp_path, "errors/404", gallery=True)
+    _write_page(tmp_path, "posts/new-gallery", gallery=True)
+    _write_page(tmp_path, "posts/no-gallery", gallery=False)
+    _write_page(tmp_path, "posts/old-gallery", gallery=False)
+    (tmp_path / "posts/old-gallery/gallery.html.jinja").write_text(
+        gallery_templates._GALLERY_TEMPLATE
+    )
+    (tmp_path / "ginjarator.toml").write_text(
+        textwrap.dedent(
+            """\
+            source_paths = [
+              "posts",
+            ]
+            templates = [
+              "errors/404/index.html.jinja",
+              "lists/main.html.jinja",
+              "posts/new-gallery/index.html.jinja",
+              "posts/no-gallery/index.html.jinja",
+              "posts/old-gallery/gallery.html.jinja",
+              "posts/old-gallery/index.html.jinja",
+            ]
+            """
+        )
+    )
+
+    with pytest.raises(ValueError, match="out of date"):
+        gallery_templates.main(args=(f"--root={tmp_path}", "--check"))
+    gallery_templates.main(args=(f"--root={tmp_path}",))
+    gallery_templates.main(args=(f"--root={tmp_path}", "--check"))
+
+    assert (tmp_path / "ginjarator.toml").read_text() == textwrap.dedent(
+        """\
+        source_paths = [
+          "posts",
+        ]
+        templates = [
+          "errors/404/gallery.html.jinja",
+          "errors/404/index.html.jinja",
+          "lists/main.html.jinja",
+          "posts/new-gallery/gallery.html.jinja",
+          "posts/new-gallery/index.html.jinja",
+          "posts/no-gallery/index.html.jinja",
+          "posts/old-gallery/index.html.jinja",
+        ]
+        """
+    )
+    assert {
+        str(path.relative_to(tmp_path))
+        for path in tmp_path.glob("**/gallery.html.jinja")
+    } == {
+        "errors/404/gallery.html.jinja",
+        "posts/new-gallery/gallery.html.jinja",
+    }
+    assert (
+        tmp_path / "posts/new-gallery/gallery.html.jinja"
+    ).read_text() == gallery_templates._GALLERY_TEMPLATE
+
+
+def test_no_templates_list(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "ginjarator.toml").write_text("templates = []\n")
+
+    with pytest.raises(ValueError, match="no templates list"):
+        gallery_templates.main(args=(f"--root={tmp_path}",))
@@ -5,24 +5,40 @@
 import lxml.html
 
 
+class Article:
+    """An <article> that can be serialized with different heading levels.
+
+    This parses the html once, so it's cheaper than calling article() for each
+    offset.
+    """
+
+    def __init__(self, html: str, /) -> None:
+        self._parsed = lxml.html.fragment_fromstring(html)
+        self._headings_by_level = {
+            level: tuple(self._parsed.cssselect(f"h{level}"))
+            for level in range(1, 7)
+        }
+        for heading_level, elements in self._headings_by_level.items():
+            for element in elements:
+                element.classes.add(f"h{heading_level}")
+
+    def html(self, offset: int = 0) -> str:
+        """Returns the html with headings adjusted by offset."""
+        for heading_level, elements in self._headings_by_level.items():
+            if elements and not 1 <= heading_level + offset <= 6:
+                raise ValueError(
+                    f"Can't adjust h{heading_level} by offset {offset}."
+                )
+        for heading_level, elements in self._headings_by_level.items():
+            for element in elements:
+                element.tag = f"h{heading_level + offset}"
+        return lxml.html.tostring(self._parsed, encoding="unicode")
+
+
 def article(
     html: str,
     /,
     offset: int = 0,
 ) -> str:
     """Adjusts the headings of an <article>."""
-    parsed = lxml.html.fragment_fromstring(html)
-    headings_by_level = {
-        level: tuple(parsed.cssselect(f"h{level}")) for level in range(1, 7)
-    }
-    for heading_level, elements in headings_by_level.items():
-        if not elements:
-            continue
-        if not 1 <= heading_level + offset <= 6:
-            raise ValueError(
-                f"Can't adjust h{heading_level} by offset {offset}."
-            )
-        for element in elements:
-            element.tag = f"h{heading_level + offset}"
-            element.classes.add(f"h{heading_level}")
-    return lxml.html.tostring(parsed, encoding="unicode")
+    return Article(html).html(offset)
@@ -60,3 +60,14 @@ def test_article_error(html: str, offset: int, error_regex: str) -> None:
 )
 def test_article(html: str, offset: int, expected: str) -> None:
     assert headings.article(html, offset=offset) == expected
+
+
+def test_article_class_multiple_offsets() -> None:
+    html = "<article><h1>foo</h1><div><h2>bar</h2></div></article>"
+    article = headings.Article(html)
+
+    assert article.html(1) == headings.article(html, offset=1)
+    assert article.html() == headings.article(html)
+    with pytest.raises(ValueError, match=r"adjust h2 by offset 5"):
+        article.html(5)
+    assert article.html(1) == headings.article(html, offset=1)
@@ -1,11 +1,33 @@
+#!/usr/bin/env python3
+
 # SPDX-FileCopyrightText: 2025 David Mandelberg <david@mandelberg.org>
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Any
+import argparse
+from collections.abc import Sequence
+import pathlib
+import sys
+import textwrap
 
+import lxml.etree
 import lxml.html
 
+
+def _ninja_escape(value: str) -> str:
+    return value.translate(
+        str.maketrans(
+            dict[str, int | str | None](
+                {
+                    " ": "$ ",
+                    ":": "$:",
+                    "$": "$$",
+                }
+            )
+        )
+    )
+
+
 _SAFE_ATTRIBUTES_BY_TAG = {
     "a": {"href"},
     "code": set(),
@@ -32,48 +54,131 @@ def comment(fragments: str, /) -> None:
                     raise ValueError(f"Not allowed: {node}")
 
 
-def _headings(parsed: Any) -> None:
-    levels = {f"h{n}": n for n in range(1, 7)}
-    previous_level = 0
-    for element in parsed.cssselect(",".join(levels)):
-        level = levels[element.tag]
-        if level > previous_level + 1:
-            # https://developer.mozilla.org/en-US/docs/Web/HTML/Reference/Elements/Heading_Elements#navigation
-            raise ValueError(f"{element.tag} skipped a level.")
-        heading_classes = set(element.classes) & levels.keys()
-        if not heading_classes:
-            raise ValueError(f"{element.tag} does not have a heading class.")
-        elif len(heading_classes) > 1:
-            raise ValueError(
-                f"{element.tag} has multiple heading classes: {heading_classes}"
-            )
-        previous_level = level
-    if len(parsed.cssselect("h1")) != 1:
-        # https://developer.mozilla.org/en-US/docs/Web/HTML/Reference/Elements/Heading_Elements#avoid_using_multiple_h1_elements_on_one_page
-        raise ValueError(f"Page does not have exactly one h1.")
+_HEADING_LEVELS = {f"h{n}": n for n in range(1, 7)}
 
 
-def _ids(parsed: Any) -> None:
+def html(document_or_fragment: str, /) -> None:
+    """Raises an exception if the html has issues."""
+    parsed = lxml.html.fromstring(document_or_fragment)
+    # This checks everything in a single walk of the tree, so that it's linear
+    # in the size of the document even with lots of nested articles.
+    previous_heading_level = 0
+    h1_count = 0
     # Blog posts can be embedded in lists with other posts. To prevent ID
     # collisions, make sure that every ID in a blog post has the blog post's own
-    # ID as a prefix.
-    for article in parsed.cssselect("article[id]"):
-        if article.classes == {"comment"}:
+    # ID as a prefix. Since the IDs of nested articles are checked the same way,
+    # only the innermost article ID needs to be checked. This has an entry for
+    # each ancestor <article>, with the innermost ID that applies to it.
+    article_ids: list[str | None] = [None]
+    for event, element in lxml.etree.iterwalk(parsed, events=("start", "end")):
+        if event == "end":
+            if element.tag == "article":
+                article_ids.pop()
             continue
-        article_id = article.get("id")
-        for descendant in article.cssselect("[id]"):
-            descendant_id = descendant.get("id")
-            if descendant is not article and not descendant_id.startswith(
-                f"{article_id}-"
-            ):
+        if (heading_level := _HEADING_LEVELS.get(element.tag)) is not None:
+            if heading_level > previous_heading_level + 1:
+                # https://developer.mozilla.org/en-US/docs/Web/HTML/Reference/Elements/Heading_Elements#navigation
+                raise ValueError(f"{element.tag} skipped a level.")
+            heading_classes = set(element.classes) & _HEADING_LEVELS.keys()
+            if not heading_classes:
                 raise ValueError(
-                    f"{descendant_id!r} is descendant of {article_id!r}, but "
-                    "its id does not start with that."
+                    f"{element.tag} does not have a heading class."
                 )
+            elif len(heading_classes) > 1:
+                raise ValueError(
+                    f"{element.tag} has multiple heading classes: "
+                    f"{heading_classes}"
+                )
+            previous_heading_level = heading_level
+            if heading_level == 1:
+                h1_count += 1
+        element_id = element.get("id")
+        article_id = article_ids[-1]
+        if (
+            element_id is not None
+            and article_id is not None
+            and not element_id.startswith(f"{article_id}-")
+        ):
+            raise ValueError(
+                f"{element_id!r} is descendant of {article_id!r}, but its id "
+                "does not start with that."
+            )
+        if element.tag == "article":
+            if element_id is not None and element.classes != {"comment"}:
+                article_ids.append(element_id)
+            else:
+                article_ids.append(article_id)
+    if h1_count != 1:
+        # https://developer.mozilla.org/en-US/docs/Web/HTML/Reference/Elements/Heading_Elements#avoid_using_multiple_h1_elements_on_one_page
+        raise ValueError(f"Page does not have exactly one h1.")
 
 
-def html(document_or_fragment: str, /) -> None:
-    """Raises an exception if the html has issues."""
-    parsed = lxml.html.fromstring(document_or_fragment)
-    _headings(parsed)
-    _ids(parsed)
+def _dyndep(args: argparse.Namespace) -> None:
+    args.dyndep.write_text(
+        textwrap.dedent(
+            f"""\
+            ninja_dyndep_version = 1
+            build $
+                    {_ninja_escape(str(args.stamp))} $
+                    : $
+                    dyndep $
+                    | $
+                    {_ninja_escape(str(args.input_file))}
+            """
+        )
+    )
+
+
+def _html(args: argparse.Namespace) -> None:
+    html(args.input_file.read_text())
+    args.stamp.write_text("")
+
+
+def _add_common_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--stamp",
+        type=pathlib.Path,
+        required=True,
+        help="Stamp file.",
+    )
+    parser.add_argument(
+        "input_file",
+        type=pathlib.Path,
+        help="File to lint.",
+    )
+
+
+def main(
+    *,
+    args: Sequence[str] = sys.argv[1:],
+) -> None:
+    parser = argparse.ArgumentParser()
+    parser.set_defaults(subcommand=lambda args: parser.print_help())
+    subparsers = parser.add_subparsers()
+
+    dyndep_parser = subparsers.add_parser(
+        "dyndep",
+        help="Write a dyndep file for the html subcommand.",
+    )
+    dyndep_parser.set_defaults(subcommand=_dyndep)
+    _add_common_args(dyndep_parser)
+    dyndep_parser.add_argument(
+        "--dyndep",
+        type=pathlib.Path,
+        required=True,
+        help="Ninja dyndep file to write.",
+    )
+
+    html_parser = subparsers.add_parser(
+        "html",
+        help="Lint an html file.",
+    )
+    html_parser.set_defaults(subcommand=_html)
+    _add_common_args(html_parser)
+
+    parsed_args = parser.parse_args(args)
+    parsed_args.subcommand(parsed_args)
+
+
+if __name__ == "__main__":
+    main()
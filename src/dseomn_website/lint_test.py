@@ -2,11 +2,23 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from collections.abc import Generator
+import contextlib
+import pathlib
+import textwrap
+import time
+
 import pytest
 
 from dseomn_website import lint
 
 
+@pytest.fixture(autouse=True)
+def _root_path(tmp_path: pathlib.Path) -> Generator[None, None, None]:
+    with contextlib.chdir(tmp_path):
+        yield
+
+
 @pytest.mark.parametrize(
     "fragments",
     (
@@ -183,3 +195,84 @@ def test_html_error(html: str, error_regex: str) -> None:
 )
 def test_html(html: str) -> None:
     lint.html(html)
+
+
+def test_main_dyndep() -> None:
+    lint.main(
+        args=(
+            "dyndep",
+            "--stamp=work/output/foo bar.html.lint-stamp",
+            "--dyndep=foo.lint-dd",
+            "output/foo bar.html",
+        )
+    )
+
+    assert pathlib.Path("foo.lint-dd").read_text() == textwrap.dedent(
+        """\
+        ninja_dyndep_version = 1
+        build $
+                work/output/foo$ bar.html.lint-stamp $
+                : $
+                dyndep $
+                | $
+                output/foo$ bar.html
+        """
+    )
+
+
+def test_main_html() -> None:
+    pathlib.Path("foo.html").write_text('<h1 class="h1">foo</h1>')
+
+    lint.main(args=("html", "--stamp=foo.lint-stamp", "foo.html"))
+
+    assert pathlib.Path("foo.lint-stamp").exists()
+
+
+def test_main_html_error() -> None:
+    pathlib.Path("foo.html").write_text("<h1>foo</h1>")
+
+    with pytest.raises(ValueError, match=r"does not have a heading class"):
+        lint.main(args=("html", "--stamp=foo.lint-stamp", "foo.html"))
+
+    assert not pathlib.Path("foo.lint-stamp").exists()
+
+
+def _list_page(*, comment_depth: int) -> str:
+    posts = []
+    for post in range(10):
+        comments = (
+            "".join(
+                f'<article class="comment" id="post{post}-comment{comment}">'
+                '<h3 class="h3">Author</h3><p>Comment</p>'
+                for comment in range(comment_depth)
+            )
+            + "</article>" * comment_depth
+        )
+        posts.append(
+            f'<article id="post{post}">'
+            '<h2 class="h1">Post</h2>'
+            f'<section id="post{post}-comments"><h3 class="h2">Comments</h3>'
+            f"{comments}</section></article>"
+        )
+    return (
+        f'<!doctype html><html><body><h1 class="h1">List</h1>{"".join(posts)}'
+    )
+
+
+def _lint_seconds(html: str) -> float:
+    start = time.perf_counter()
+    lint.html(html)
+    return time.perf_counter() - start
+
+
+@pytest.mark.slow
+def test_html_scales_linearly() -> None:
+    small = _list_page(comment_depth=25)
+    large = _list_page(comment_depth=200)
+
+    small_seconds = min(_lint_seconds(small) for _ in range(5))
+    large_seconds = min(_lint_seconds(large) for _ in range(5))
+
+    # The large page is 8 times as big, so linear time would be about 8 times
+    # slower, and quadratic time about 64 times slower.
+    assert large_seconds < small_seconds * 24
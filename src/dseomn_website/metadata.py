@@ -10,19 +10,87 @@ import datetime
 import email.headerregistry
 import email.utils
 import functools
+import hashlib
+import heapq
 import http
 import itertools
 import json
+import math
+import pathlib
+import sys
 import tomllib
-from typing import Any, final, Literal, override, Self
+from typing import Any, final, Literal, overload, override, Self
 import urllib.parse
 import uuid as uuid_
 
 import ginjarator
 
+from dseomn_website import comment_pack
+from dseomn_website import disk_cache
 from dseomn_website import lint
+from dseomn_website import pagination
 from dseomn_website import paths
 
+_TOML_CACHE_MAX_SIZE = 64 * 1024 * 1024
+_TOML_CACHE_VERSION = f"tomllib {sys.version}"
+_TOML_TYPE_KEY = "__toml_type__"
+
+
+def _toml_to_json(value: Any) -> Any:
+    # datetime is a subclass of date, so it needs to be checked first.
+    if isinstance(value, datetime.datetime):
+        return {_TOML_TYPE_KEY: "datetime", "value": value.isoformat()}
+    elif isinstance(value, datetime.date):
+        return {_TOML_TYPE_KEY: "date", "value": value.isoformat()}
+    elif isinstance(value, datetime.time):
+        return {_TOML_TYPE_KEY: "time", "value": value.isoformat()}
+    raise TypeError(f"Unexpected TOML value: {value!r}")
+
+
+def _toml_from_json(value: dict[str, Any]) -> Any:
+    if value.keys() != {_TOML_TYPE_KEY, "value"}:
+        return value
+    match value[_TOML_TYPE_KEY]:
+        case "datetime":
+            return datetime.datetime.fromisoformat(value["value"])
+        case "date":
+            return datetime.date.fromisoformat(value["value"])
+        case "time":
+            return datetime.time.fromisoformat(value["value"])
+        case _:
+            raise ValueError(f"Unexpected TOML type: {value!r}")
+
+
+def _load_toml(path: ginjarator.paths.Filesystem) -> dict[str, Any]:
+    """Reads and parses a TOML file.
+
+    Every template that lists posts loads all their TOML files, so this caches
+    the parsed data as JSON, which is much faster to parse. The file is still
+    read through ginjarator, so dependencies are tracked as usual, and the cache
+    is keyed by the file's contents.
+    """
+    return _parse_toml(ginjarator.api().fs.read_text(path, defer_ok=False))
+
+
+def _parse_toml(contents: str) -> dict[str, Any]:
+    cache = disk_cache.in_work(
+        "toml-cache.sqlite3",
+        max_size=_TOML_CACHE_MAX_SIZE,
+        root=pathlib.Path(ginjarator.api().fs.root),
+    )
+    if cache is None:
+        return tomllib.loads(contents)
+    key = hashlib.sha256(f"{_TOML_CACHE_VERSION}\0{contents}".encode()).digest()
+    if (cached := cache.get(key)) is not None:
+        raw: dict[str, Any] = json.loads(
+            cached,
+            object_hook=_toml_from_json,
+        )
+        return raw
+    raw = tomllib.loads(contents)
+    cache.set(key, json.dumps(raw, default=_toml_to_json).encode())
+    return raw
+
 
 def _require_timezone(value: datetime.datetime) -> None:
     if value.tzinfo is None:
@@ -258,6 +326,43 @@ class Media:
 
 
 _COMMENTS_PER_FEED = 50
+# Posts with more comments than this have their comments split into pages, with
+# only the first page on the post's page.
+_COMMENTS_PER_PAGE = 100
+_COMMENT_LINT_CACHE_MAX_SIZE = 16 * 1024 * 1024
+
+
+@functools.cache
+def _lint_source() -> bytes:
+    return pathlib.Path(lint.__file__).read_bytes()
+
+
+def _lint_comment(contents: str) -> None:
+    # Comments are loaded by lots of templates and they rarely change, so this
+    # remembers which comments passed lint. The key includes lint's source, so
+    # that changes to lint rules are applied to existing comments.
+    cache = disk_cache.in_work(
+        "comment-lint-cache.sqlite3",
+        max_size=_COMMENT_LINT_CACHE_MAX_SIZE,
+        root=pathlib.Path(ginjarator.api().fs.root),
+    )
+    if cache is None:
+        lint.comment(contents)
+        return
+    key = hashlib.sha256(_lint_source() + b"\0" + contents.encode()).digest()
+    if cache.get(key) is not None:
+        return
+    lint.comment(contents)
+    cache.set(key, b"")
+
+
+@functools.cache
+def _load_comment_pack(
+    path: ginjarator.paths.Filesystem,
+) -> Mapping[uuid_.UUID, comment_pack.Entry]:
+    return comment_pack.loads(
+        ginjarator.api().fs.read_text(path, defer_ok=False)
+    )
 
 
 @dataclasses.dataclass(frozen=True, kw_only=True)
@@ -266,7 +371,9 @@ class Comment(Fragment):
     published: datetime.datetime
     author: User
     in_reply_to: uuid_.UUID | None
+    # Either the comment's HTML file, or a comment pack, see contents_packed.
     contents_path: ginjarator.paths.Filesystem
+    contents_packed: bool = False
 
     @classmethod
     def load(
@@ -277,12 +384,43 @@ class Comment(Fragment):
         comment_id: str,
         comment_uuid: uuid_.UUID,
     ) -> Self:
-        raw = tomllib.loads(
-            ginjarator.api().fs.read_text(
-                parent_path / f"{comment_uuid}.toml",
-                defer_ok=False,
-            )
+        return cls._parse(
+            _load_toml(parent_path / f"{comment_uuid}.toml"),
+            parent_url_path=parent_url_path,
+            comment_id=comment_id,
+            comment_uuid=comment_uuid,
+            contents_path=parent_path / f"{comment_uuid}.html",
+        )
+
+    @classmethod
+    def load_packed(
+        cls,
+        *,
+        parent_url_path: str,
+        pack_path: ginjarator.paths.Filesystem,
+        comment_id: str,
+        comment_uuid: uuid_.UUID,
+    ) -> Self:
+        return cls._parse(
+            _parse_toml(_load_comment_pack(pack_path)[comment_uuid].metadata),
+            parent_url_path=parent_url_path,
+            comment_id=comment_id,
+            comment_uuid=comment_uuid,
+            contents_path=pack_path,
+            contents_packed=True,
         )
+
+    @classmethod
+    def _parse(
+        cls,
+        raw: Mapping[str, Any],
+        *,
+        parent_url_path: str,
+        comment_id: str,
+        comment_uuid: uuid_.UUID,
+        contents_path: ginjarator.paths.Filesystem,
+        contents_packed: bool = False,
+    ) -> Self:
         if unexpected_keys := raw.keys() - {
             "published",
             "author",
@@ -300,16 +438,22 @@ class Comment(Fragment):
             in_reply_to=(
                 uuid_.UUID(raw["in_reply_to"]) if "in_reply_to" in raw else None
             ),
-            contents_path=parent_path / f"{comment_uuid}.html",
+            contents_path=contents_path,
+            contents_packed=contents_packed,
         )
 
     @functools.cached_property
     def contents(self) -> str:
-        contents = ginjarator.api().fs.read_text(
-            self.contents_path,
-            defer_ok=False,
-        )
-        lint.comment(contents)
+        if self.contents_packed:
+            contents = _load_comment_pack(self.contents_path)[
+                self.uuid
+            ].contents
+        else:
+            contents = ginjarator.api().fs.read_text(
+                self.contents_path,
+                defer_ok=False,
+            )
+        _lint_comment(contents)
         return contents
 
     @functools.cached_property
@@ -322,6 +466,115 @@ class Comment(Fragment):
         return f"Comment by {self.author.name} on {self.published}"
 
 
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class CommentThreadItem:
+    """Start or end of a comment in a flattened thread.
+
+    Attributes:
+        comment: The comment.
+        depth: Number of ancestors of the comment.
+        opening: Whether this is the start of the comment, before its replies.
+    """
+
+    comment: Comment
+    depth: int
+    opening: bool
+
+
+def _comment_page_numbers(
+    comments: Sequence[Comment],
+) -> Mapping[uuid_.UUID, int]:
+    """Returns the page number of each comment.
+
+    Each top-level comment is on the same page as all of its replies, so a page
+    can have more than _COMMENTS_PER_PAGE comments if it has a long thread.
+
+    Args:
+        comments: Comments on a post, sorted oldest first.
+    """
+    root_by_uuid = dict[uuid_.UUID, uuid_.UUID]()
+    for comment in comments:
+        if comment.in_reply_to is None:
+            root_by_uuid[comment.uuid] = comment.uuid
+        else:
+            root_by_uuid[comment.uuid] = root_by_uuid[comment.in_reply_to]
+    # Replies are newer than their parents, so this is in the same order as the
+    # top-level comments.
+    thread_sizes = collections.Counter(root_by_uuid.values())
+    page_number_by_root = dict[uuid_.UUID, int]()
+    page_number = 1
+    page_size = 0
+    for root, thread_size in thread_sizes.items():
+        if page_size and page_size + thread_size > _COMMENTS_PER_PAGE:
+            page_number += 1
+            page_size = 0
+        page_number_by_root[root] = page_number
+        page_size += thread_size
+    return {
+        comment_uuid: page_number_by_root[root]
+        for comment_uuid, root in root_by_uuid.items()
+    }
+
+
+def _comments_page_url_path(post_url_path: str, page_number: int) -> str:
+    if page_number == 1:
+        return post_url_path
+    else:
+        return urllib.parse.urljoin(
+            post_url_path,
+            f"comments/page/{page_number}/",
+        )
+
+
+def _newest_first(comments: Sequence[Comment]) -> Iterable[Comment]:
+    """Yields comments newest first, with ties in their original order.
+
+    Args:
+        comments: Comments sorted oldest first.
+    """
+    end = len(comments)
+    while end > 0:
+        start = end - 1
+        while (
+            start > 0
+            and comments[start - 1].published == comments[end - 1].published
+        ):
+            start -= 1
+        yield from comments[start:end]
+        end = start
+
+
+def _newest_comments(
+    comments_by_post: Iterable[Sequence[Comment]],
+) -> Sequence[Comment]:
+    """Returns the newest comments for a feed.
+
+    Comments with the same published time are in the order of their posts,
+    then in their order within each post, like a stable sort of all comments.
+
+    Args:
+        comments_by_post: Comments of each post, sorted oldest first.
+    """
+    # This only looks at as many comments as it returns, plus one per post with
+    # comments, so it doesn't slow down as the total number of comments grows.
+    # Posts without comments are skipped so that their comments aren't loaded.
+    return tuple(
+        comment
+        for _, comment in itertools.islice(
+            heapq.merge(
+                *(
+                    zip(itertools.repeat(post_index), _newest_first(comments))
+                    for post_index, comments in enumerate(comments_by_post)
+                    if comments
+                ),
+                key=lambda item: (item[1].published, -item[0]),
+                reverse=True,
+            ),
+            _COMMENTS_PER_FEED,
+        )
+    )
+
+
 @final
 @dataclasses.dataclass(frozen=True, kw_only=True)
 class Feed[EntryType](Resource):
@@ -349,9 +602,11 @@ class Feed[EntryType](Resource):
 
 
 def _template_is_post(path: ginjarator.paths.Filesystem) -> bool:
-    return path.is_relative_to(
-        "posts"
-    ) and path.parent != ginjarator.paths.Filesystem("posts")
+    return (
+        path.is_relative_to("posts")
+        and path.parent != ginjarator.paths.Filesystem("posts")
+        and path.name == "index.html.jinja"
+    )
 
 
 @dataclasses.dataclass(frozen=True, kw_only=True)
@@ -360,23 +615,28 @@ class Page(Resource):
     media: Media = Media.parse({})
 
     @classmethod
-    def current(cls) -> Self:
-        current_template = ginjarator.api().paths.current_template
+    def for_template(cls, template: ginjarator.paths.Filesystem) -> Self:
+        if template.name == "gallery.html.jinja":
+            # The gallery template next to a page's index.html.jinja writes
+            # the page's gallery item details pages. See gallery_templates.py.
+            template = template.with_name("index.html.jinja")
         page: Page
-        if current_template.is_relative_to("errors"):
-            page = Error.load(current_template)
-        elif current_template.is_relative_to("standalone"):
-            page = Standalone.load(current_template)
-        elif _template_is_post(current_template):
-            page = Post.load(current_template)
+        if template.is_relative_to("errors"):
+            page = Error.load(template)
+        elif template.is_relative_to("standalone"):
+            page = Standalone.load(template)
+        elif _template_is_post(template):
+            page = Post.load(template)
         else:
-            raise NotImplementedError(str(current_template))
+            raise NotImplementedError(str(template))
         if not isinstance(page, cls):
-            raise TypeError(
-                f"{str(current_template)!r} is not an instance of {cls}"
-            )
+            raise TypeError(f"{str(template)!r} is not an instance of {cls}")
         return page
 
+    @classmethod
+    def current(cls) -> Self:
+        return cls.for_template(ginjarator.api().paths.current_template)
+
     @classmethod
     def all(cls) -> Collection[Self]:
         return tuple(
@@ -402,6 +662,21 @@ class Page(Resource):
                 )
         return result
 
+    @functools.cached_property
+    def media_item_details_by_gallery(
+        self,
+    ) -> Mapping[str, Sequence["MediaItemDetails"]]:
+        result = dict[str, list[MediaItemDetails]]()
+        for media_item_details in self.media_item_details_by_source.values():
+            assert media_item_details.item.gallery is not None
+            result.setdefault(media_item_details.item.gallery, []).append(
+                media_item_details
+            )
+        return {
+            gallery: tuple(gallery_items)
+            for gallery, gallery_items in result.items()
+        }
+
 
 @final
 @dataclasses.dataclass(frozen=True, kw_only=True)
@@ -458,12 +733,7 @@ class Error(Page):
     @classmethod
     @functools.cache
     def load(cls, template: ginjarator.paths.Filesystem) -> Self:
-        raw = tomllib.loads(
-            ginjarator.api().fs.read_text(
-                template.parent / "metadata.toml",
-                defer_ok=False,
-            )
-        )
+        raw = _load_toml(template.parent / "metadata.toml")
         if unexpected_keys := raw.keys() - {"media"}:
             raise ValueError(f"Unexpected keys: {unexpected_keys}")
         status = http.HTTPStatus(int(template.parent.name))
@@ -481,6 +751,7 @@ class Error(Page):
             cls.load(template)
             for template in ginjarator.api().fs.read_config().templates
             if template.is_relative_to("errors")
+            and template.name == "index.html.jinja"
         )
 
 
@@ -503,12 +774,7 @@ class Standalone(Page):
     @classmethod
     @functools.cache
     def load(cls, template: ginjarator.paths.Filesystem) -> Self:
-        raw = tomllib.loads(
-            ginjarator.api().fs.read_text(
-                template.parent / "metadata.toml",
-                defer_ok=False,
-            )
-        )
+        raw = _load_toml(template.parent / "metadata.toml")
         if unexpected_keys := raw.keys() - {"title", "media"}:
             raise ValueError(f"Unexpected keys: {unexpected_keys}")
         return cls(
@@ -532,6 +798,156 @@ def _post_url_path(published: datetime.datetime, slug: str) -> str:
     return urllib.parse.quote(f"/{published.strftime("%Y/%m/%d")}/{slug}/")
 
 
+class _LazySequence[T](Sequence[T]):
+    """Sequence that's loaded when its items are first needed."""
+
+    def __init__(
+        self,
+        load: Callable[[], Sequence[T]],
+        *,
+        length: int | None = None,
+    ) -> None:
+        """Initializer.
+
+        Args:
+            load: Function to load the items.
+            length: Number of items, if it's known without loading them.
+        """
+        self._load = load
+        self._length = length
+
+    @functools.cached_property
+    def _items(self) -> Sequence[T]:
+        items = self._load()
+        assert self._length is None or len(items) == self._length
+        return items
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[T]: ...
+
+    @override
+    def __getitem__(self, index: int | slice) -> T | Sequence[T]:
+        return self._items[index]
+
+    @override
+    def __len__(self) -> int:
+        if self._length is not None:
+            return self._length
+        return len(self._items)
+
+    @override
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _LazySequence):
+            return self._items == other._items
+        return self._items == other
+
+    @override
+    def __hash__(self) -> int:
+        return hash(self._items)
+
+    @override
+    def __repr__(self) -> str:
+        return repr(self._items)
+
+
+def _comment_in_reply_to_is_valid(
+    comment: Comment,
+    comment_by_uuid: Mapping[uuid_.UUID, Comment],
+) -> bool:
+    if comment.in_reply_to is None:
+        return True
+    if comment.in_reply_to not in comment_by_uuid:
+        return False
+    parent = comment_by_uuid[comment.in_reply_to]
+    if comment.published <= parent.published:
+        # In addition to catching mistakes, this also prevents graph cycles.
+        return False
+    return True
+
+
+def _load_post_comments(
+    *,
+    url_path: str,
+    source_dir_name: str,
+    comments_format: Literal["files", "pack"],
+    comment_uuids: Sequence[uuid_.UUID],
+) -> Sequence[Comment]:
+    private_path = paths.PRIVATE / "posts" / source_dir_name
+    match comments_format:
+        case "files":
+            comments = tuple(
+                Comment.load(
+                    parent_url_path=url_path,
+                    parent_path=private_path / "comments",
+                    comment_id=f"{source_dir_name}-comment-{comment_uuid}",
+                    comment_uuid=comment_uuid,
+                )
+                for comment_uuid in comment_uuids
+            )
+        case "pack":
+            pack_path = private_path / "comments.pack"
+            if _load_comment_pack(pack_path).keys() != set(comment_uuids):
+                raise ValueError(
+                    f"{pack_path} doesn't match the listed comments."
+                )
+            comments = tuple(
+                Comment.load_packed(
+                    parent_url_path=url_path,
+                    pack_path=pack_path,
+                    comment_id=f"{source_dir_name}-comment-{comment_uuid}",
+                    comment_uuid=comment_uuid,
+                )
+                for comment_uuid in comment_uuids
+            )
+    if list(comments) != sorted(
+        comments,
+        key=lambda comment: comment.published,
+    ):
+        raise ValueError(f"{comments} is not sorted.")
+    comment_by_uuid = {comment.uuid: comment for comment in comments}
+    if invalid_replies := {
+        comment
+        for comment in comments
+        if not _comment_in_reply_to_is_valid(comment, comment_by_uuid)
+    }:
+        raise ValueError(f"{invalid_replies} have invalid in_reply_to fields.")
+    page_numbers = _comment_page_numbers(comments)
+    return tuple(
+        (
+            comment
+            if page_numbers[comment.uuid] == 1
+            else dataclasses.replace(
+                comment,
+                url_path=urllib.parse.urljoin(
+                    _comments_page_url_path(
+                        url_path,
+                        page_numbers[comment.uuid],
+                    ),
+                    f"#{urllib.parse.quote(comment.id)}",
+                ),
+            )
+        )
+        for comment in comments
+    )
+
+
+def _post_work_path(post_id: str) -> ginjarator.paths.Filesystem:
+    return paths.WORK / "posts" / post_id
+
+
+def _post_listing_path(post_id: str) -> ginjarator.paths.Filesystem:
+    return _post_work_path(post_id) / "listing.json"
+
+
+def _post_listing_raw(raw: Mapping[str, Any]) -> dict[str, Any]:
+    # Media can be large and changes more often than anything that's shown in
+    # lists.
+    return {key: value for key, value in raw.items() if key != "media"}
+
+
 @dataclasses.dataclass(frozen=True, kw_only=True)
 class Post(Page):
     id: str
@@ -540,47 +956,50 @@ class Post(Page):
     author: User
     tags: Sequence[str]
     url_path_aliases: Collection[str]
-    comments: Sequence[Comment]
-
-    def _comment_in_reply_to_is_valid(self, comment: Comment) -> bool:
-        if comment.in_reply_to is None:
-            return True
-        if comment.in_reply_to not in self.comment_by_uuid:
-            return False
-        parent = self.comment_by_uuid[comment.in_reply_to]
-        if comment.published <= parent.published:
-            # In addition to catching mistakes, this also prevents graph cycles.
-            return False
-        return True
+    # This is usually a _LazySequence, so it's not hashed or compared to avoid
+    # loading it. Posts are identified by their other fields anyway.
+    comments: Sequence[Comment] = dataclasses.field(hash=False, compare=False)
 
     def __post_init__(self) -> None:
         if unknown_tags := set(self.tags) - set(SITE.tags):
             raise ValueError(f"Unknown tags: {unknown_tags}")
         if list(self.tags) != sorted(set(self.tags)):
             raise ValueError(f"{self.tags} is not sorted and unique.")
-        if list(self.comments) != sorted(
-            self.comments,
-            key=lambda comment: comment.published,
-        ):
-            raise ValueError(f"{self.comments} is not sorted.")
-        if invalid_replies := {
-            comment
-            for comment in self.comments
-            if not self._comment_in_reply_to_is_valid(comment)
-        }:
-            raise ValueError(
-                f"{invalid_replies} have invalid in_reply_to fields."
-            )
 
     @classmethod
     @functools.cache
     def load(cls, template: ginjarator.paths.Filesystem) -> Self:
-        raw = tomllib.loads(
-            ginjarator.api().fs.read_text(
-                template.parent / "metadata.toml",
-                defer_ok=False,
-            )
+        return cls._parse(
+            template, _load_toml(template.parent / "metadata.toml")
         )
+
+    @classmethod
+    @functools.cache
+    def load_listing(cls, template: ginjarator.paths.Filesystem) -> Self:
+        """Loads a post without its media, for lists of posts.
+
+        This reads the projection that the post's template writes to
+        listing_path, so that changes to the post's media don't re-render
+        everything that lists the post. When the projection isn't available
+        yet, this falls back to metadata.toml.
+        """
+        listing = ginjarator.api().fs.read_text(
+            _post_listing_path(template.parent.name)
+        )
+        if listing is None:
+            raw = _post_listing_raw(
+                _load_toml(template.parent / "metadata.toml")
+            )
+        else:
+            raw = json.loads(listing, object_hook=_toml_from_json)
+        return cls._parse(template, raw)
+
+    @classmethod
+    def _parse(
+        cls,
+        template: ginjarator.paths.Filesystem,
+        raw: Mapping[str, Any],
+    ) -> Self:
         if unexpected_keys := raw.keys() - {
             "uuid",
             "published",
@@ -589,6 +1008,7 @@ class Post(Page):
             "tags",
             "media",
             "comments",
+            "comments_format",
         }:
             raise ValueError(f"Unexpected keys: {unexpected_keys}")
         published_local = raw["published"]
@@ -602,6 +1022,12 @@ class Post(Page):
             )
         slug = source_dir_name.removeprefix(source_dir_date_prefix)
         url_path = _post_url_path(published, slug)
+        comment_uuids = tuple(
+            uuid_.UUID(comment_uuid) for comment_uuid in raw.get("comments", [])
+        )
+        comments_format = raw.get("comments_format", "files")
+        if comments_format not in ("files", "pack"):
+            raise ValueError(f"Unknown comments_format: {comments_format!r}")
         return cls(
             url_path=url_path,
             title=raw["title"],
@@ -616,25 +1042,36 @@ class Post(Page):
             url_path_aliases=(
                 frozenset((_post_url_path(published_local, slug),)) - {url_path}
             ),
-            comments=tuple(
-                Comment.load(
-                    parent_url_path=url_path,
-                    parent_path=(
-                        paths.PRIVATE / "posts" / source_dir_name / "comments"
-                    ),
-                    comment_id=f"{source_dir_name}-comment-{comment_uuid}",
-                    comment_uuid=uuid_.UUID(comment_uuid),
-                )
-                for comment_uuid in raw.get("comments", [])
+            comments=_LazySequence(
+                functools.partial(
+                    _load_post_comments,
+                    url_path=url_path,
+                    source_dir_name=source_dir_name,
+                    comments_format=comments_format,
+                    comment_uuids=comment_uuids,
+                ),
+                length=len(comment_uuids),
             ),
         )
 
     @override
     @classmethod
     def all(cls) -> Sequence[Self]:
+        return cls._all(cls.load)
+
+    @classmethod
+    def all_listings(cls) -> Sequence[Self]:
+        """Returns all posts from load_listing(), newest first."""
+        return cls._all(cls.load_listing)
+
+    @classmethod
+    def _all(
+        cls,
+        load: Callable[[ginjarator.paths.Filesystem], Self],
+    ) -> Sequence[Self]:
         posts = sorted(
             (
-                cls.load(template)
+                load(template)
                 for template in ginjarator.api().fs.read_config().templates
                 if _template_is_post(template)
             ),
@@ -663,7 +1100,26 @@ class Post(Page):
 
     @property
     def work_path(self) -> ginjarator.paths.Filesystem:
-        return paths.WORK / "posts" / self.id
+        return _post_work_path(self.id)
+
+    @property
+    def listing_path(self) -> ginjarator.paths.Filesystem:
+        return _post_listing_path(self.id)
+
+    @property
+    def listing(self) -> str:
+        """Projection of metadata.toml for load_listing()."""
+        return json.dumps(
+            _post_listing_raw(
+                _load_toml(
+                    ginjarator.paths.Filesystem(
+                        "posts", self.id, "metadata.toml"
+                    )
+                )
+            ),
+            default=_toml_to_json,
+            sort_keys=True,
+        )
 
     @property
     def include_fragment_path(self) -> ginjarator.paths.Filesystem:
@@ -691,18 +1147,74 @@ class Post(Page):
         }
         for comment in self.comments:
             result[comment.in_reply_to].append(comment)
-        assert collections.Counter(
-            itertools.chain.from_iterable(result.values())
-        ) == collections.Counter(self.comments)
         return result
 
+    @functools.cached_property
+    def comment_thread(self) -> Sequence[CommentThreadItem]:
+        """Comments in the order they're rendered, with replies nested.
+
+        Each comment has an opening item, then the items of its replies, then a
+        closing item. This is built without recursion, so that templates can
+        render deep threads with a loop instead of recursive macros.
+        """
+        result = list[CommentThreadItem]()
+        ancestors = list[Comment]()
+        # Remaining comments at each depth, with the top level first.
+        remaining = [iter(self.comments_by_parent[None])]
+        while remaining:
+            comment = next(remaining[-1], None)
+            if comment is None:
+                remaining.pop()
+                if ancestors:
+                    result.append(
+                        CommentThreadItem(
+                            comment=ancestors.pop(),
+                            depth=len(ancestors),
+                            opening=False,
+                        )
+                    )
+                continue
+            result.append(
+                CommentThreadItem(
+                    comment=comment,
+                    depth=len(ancestors),
+                    opening=True,
+                )
+            )
+            ancestors.append(comment)
+            remaining.append(iter(self.comments_by_parent[comment.uuid]))
+        return tuple(result)
+
+    @functools.cached_property
+    def comments_page_by_number(self) -> Mapping[int, "CommentsPage"]:
+        """Pages of comments, where the first is part of the post's page."""
+        page_numbers = _comment_page_numbers(self.comments)
+        thread_by_page_number = dict[int, list[CommentThreadItem]]({1: []})
+        for item in self.comment_thread:
+            thread_by_page_number.setdefault(
+                page_numbers[item.comment.uuid], []
+            ).append(item)
+        return {
+            page_number: CommentsPage(
+                url_path=_comments_page_url_path(self.url_path, page_number),
+                title=(
+                    self.title
+                    if page_number == 1
+                    else _title_join(
+                        parent=self.title,
+                        child=f"Comments (page {page_number})",
+                    )
+                ),
+                post=self,
+                page_number=page_number,
+                thread=tuple(thread),
+            )
+            for page_number, thread in thread_by_page_number.items()
+        }
+
     @functools.cached_property
     def _comments_feed_entries(self) -> Sequence[Comment]:
-        return sorted(
-            self.comments,
-            key=lambda comment: comment.published,
-            reverse=True,
-        )[:_COMMENTS_PER_FEED]
+        return _newest_comments((self.comments,))
 
     @functools.cached_property
     def _comments_feed_updated(self) -> datetime.datetime:
@@ -721,7 +1233,38 @@ class Post(Page):
         )
 
 
+@final
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class CommentsPage(Page):
+    post: Post
+    page_number: int
+    thread: Sequence[CommentThreadItem]
+
+    @override
+    @classmethod
+    def all(cls) -> Collection[Self]:
+        # The first page of comments is part of the post's page, and posts with
+        # few enough comments don't need their comments loaded to know that
+        # there's only one page.
+        return tuple(
+            page
+            for post in Post.all()
+            if len(post.comments) > _COMMENTS_PER_PAGE
+            for page in post.comments_page_by_number.values()
+            if page.page_number > 1
+        )
+
+    @functools.cached_property
+    def comments_section(self) -> Fragment:
+        return self.fragment(self.post.comments_section.id)
+
+
 _POSTS_PER_PAGE = 10
+# Whether list pages are numbered from the oldest, with the newest page at the
+# list's URL. Then publishing a post only changes the newest page, plus the new
+# numbered page when the newest page fills up, instead of moving posts between
+# every pair of adjacent pages.
+_STABLE_PAGINATION = True
 _POSTS_PER_FEED = 20
 
 
@@ -744,22 +1287,24 @@ class PostListPage(Page):
 
 @dataclasses.dataclass(frozen=True, kw_only=True)
 class PostList(Page):
-    filter: Callable[[Post], bool]
+    filter_tag: str | None
 
     @classmethod
+    @functools.cache
     def main(cls) -> Self:
         return cls(
             url_path="/",
             title="Blog",
-            filter=lambda post: True,
+            filter_tag=None,
         )
 
     @classmethod
+    @functools.cache
     def tag(cls, tag: str) -> Self:
         return cls(
             url_path=urllib.parse.quote(f"/tag/{tag}/"),
             title=f"Tag: {tag}",
-            filter=lambda post: tag in post.tags,
+            filter_tag=tag,
         )
 
     @override
@@ -770,24 +1315,93 @@ class PostList(Page):
             *(cls.tag(tag) for tag in SITE.tags),
         )
 
+    @property
+    def templates(self) -> Collection[ginjarator.paths.Filesystem]:
+        """Templates that write the list's pages and feeds."""
+        if self.filter_tag is None:
+            name = "main"
+        else:
+            name = f"tag/{self.filter_tag}"
+        return (
+            ginjarator.paths.Filesystem(f"lists/{name}.html.jinja"),
+            ginjarator.paths.Filesystem(f"lists/{name}.atom.jinja"),
+        )
+
+    @classmethod
+    def current(cls) -> Self:
+        current_template = ginjarator.api().paths.current_template
+        for post_list in cls.all():
+            if current_template in post_list.templates:
+                return post_list
+        raise NotImplementedError(str(current_template))
+
+    @staticmethod
+    @functools.cache
+    def _posts_by_tag() -> Mapping[str | None, Sequence[Post]]:
+        """Returns posts by tag, with None for all posts."""
+        posts = Post.all_listings()
+        posts_by_tag = dict[str | None, list[Post]]()
+        for post in posts:
+            for tag in post.tags:
+                posts_by_tag.setdefault(tag, []).append(post)
+        return {
+            None: tuple(posts),
+            **{
+                tag: tuple(tag_posts) for tag, tag_posts in posts_by_tag.items()
+            },
+        }
+
     @functools.cached_property
     def posts(self) -> Sequence[Post]:
-        return tuple(post for post in Post.all() if self.filter(post))
+        return self._posts_by_tag().get(self.filter_tag, ())
+
+    @functools.cached_property
+    def _newest_page_number(self) -> int:
+        if _STABLE_PAGINATION:
+            return math.ceil(len(self.posts) / _POSTS_PER_PAGE)
+        else:
+            return 1
+
+    def _numbered_url_path(self, page_number: int) -> str:
+        return urllib.parse.urljoin(self.url_path, f"page/{page_number}/")
 
     def _page_url_path(self, page_number: int) -> str:
-        if page_number == 1:
+        if page_number == self._newest_page_number:
             return self.url_path
         else:
-            return urllib.parse.urljoin(self.url_path, f"page/{page_number}/")
+            return self._numbered_url_path(page_number)
 
     def _page_title(self, page_number: int) -> str:
-        if page_number == 1:
+        if page_number == self._newest_page_number:
             return self.title
         else:
             return f"{self.title} (page {page_number})"
 
     @functools.cached_property
     def page_by_number(self) -> Mapping[int, PostListPage]:
+        """Pages of the list, with the newest first."""
+        if _STABLE_PAGINATION:
+            # The newest page is the only one that can have fewer posts than
+            # _POSTS_PER_PAGE, so that the other pages never change.
+            numbered_pages = reversed(
+                tuple(
+                    enumerate(
+                        (
+                            tuple(reversed(page_posts))
+                            for page_posts in itertools.batched(
+                                reversed(self.posts),
+                                _POSTS_PER_PAGE,
+                            )
+                        ),
+                        start=1,
+                    )
+                )
+            )
+        else:
+            numbered_pages = enumerate(
+                itertools.batched(self.posts, _POSTS_PER_PAGE),
+                start=1,
+            )
         return {
             page_number: PostListPage(
                 url_path=self._page_url_path(page_number),
@@ -795,24 +1409,100 @@ class PostList(Page):
                 page_number=page_number,
                 posts=page_posts,
             )
-            for page_number, page_posts in enumerate(
-                itertools.batched(self.posts, _POSTS_PER_PAGE),
-                start=1,
-            )
+            for page_number, page_posts in numbered_pages
         }
 
+    def page_link(self, page_number: int) -> str:
+        """Returns the URL path for links to a page from other pages.
+
+        With stable pagination, this is the page's numbered URL path even for
+        the newest page, so that links to it don't change when it stops being
+        the newest page. See newest_page_link.
+        """
+        if _STABLE_PAGINATION:
+            return self._numbered_url_path(page_number)
+        else:
+            return self.page_by_number[page_number].url_path
+
+    @property
+    def newest_page_link(self) -> str | None:
+        """Link to the newest page, if it's not the list's URL path.
+
+        This needs a redirect to the list's URL path.
+        """
+        if _STABLE_PAGINATION:
+            return self.page_link(self._newest_page_number)
+        else:
+            return None
+
+    def newer_page_number(self, page_number: int) -> int:
+        if _STABLE_PAGINATION:
+            return page_number + 1
+        else:
+            return page_number - 1
+
+    def older_page_number(self, page_number: int) -> int:
+        if _STABLE_PAGINATION:
+            return page_number - 1
+        else:
+            return page_number + 1
+
+    def page_nav(self, current: int) -> Sequence[int | None]:
+        """Returns page numbers for a navigation list, newest first.
+
+        See pagination.nav().
+        """
+        if not _STABLE_PAGINATION:
+            return tuple(
+                pagination.nav(current=current, total=len(self.page_by_number))
+            )
+        # Pages other than the newest only link as far as the next newer page,
+        # which always exists, so that their links never change.
+        return tuple(
+            pagination.nav(
+                current=current,
+                total=min(current + 1, self._newest_page_number),
+            )
+        )[::-1]
+
     @functools.cached_property
-    def link_by_year(self) -> Mapping[int, str]:
-        """Links to the most recent post of each year."""
-        result = dict[int, str]()
-        for page in self.page_by_number.values():
-            for post in page.posts:
-                result.setdefault(
-                    post.published.year,
-                    page.fragment(post.id).url_path,
-                )
+    def _oldest_post_by_year(self) -> Mapping[int, tuple[int, Post]]:
+        """Returns the oldest post of each year and its page number."""
+        result = dict[int, tuple[int, Post]]()
+        for page_number, page in sorted(self.page_by_number.items()):
+            for post in reversed(page.posts):
+                result.setdefault(post.published.year, (page_number, post))
         return result
 
+    def link_by_year(self, current: int) -> Mapping[int, str]:
+        """Returns links to each year's posts from a page, newest year first.
+
+        With stable pagination, the links go to the oldest post of each year,
+        and each page only links to years that start on or before that page, so
+        that pages other than the newest never change. Otherwise, they go to the
+        most recent post of each year.
+        """
+        if not _STABLE_PAGINATION:
+            result = dict[int, str]()
+            for page in self.page_by_number.values():
+                for post in page.posts:
+                    result.setdefault(
+                        post.published.year,
+                        page.fragment(post.id).url_path,
+                    )
+            return result
+        return {
+            year: urllib.parse.urljoin(
+                self.page_link(page_number),
+                f"#{urllib.parse.quote(post.id)}",
+            )
+            for year, (page_number, post) in sorted(
+                self._oldest_post_by_year.items(),
+                reverse=True,
+            )
+            if page_number <= current
+        }
+
     @functools.cached_property
     def feed(self) -> Feed[Post]:
         return Feed(
@@ -824,15 +1514,7 @@ class PostList(Page):
 
     @functools.cached_property
     def _comments_feed_entries(self) -> Sequence[Comment]:
-        return tuple(
-            sorted(
-                itertools.chain.from_iterable(
-                    post.comments for post in self.posts
-                ),
-                key=lambda comment: comment.published,
-                reverse=True,
-            )[:_COMMENTS_PER_FEED]
-        )
+        return _newest_comments(post.comments for post in self.posts)
 
     @functools.cached_property
     def _comments_feed_updated(self) -> datetime.datetime:
@@ -2,17 +2,25 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from collections.abc import Sequence
+import dataclasses
 import datetime
 import http
+import itertools
 import json
 import pathlib
 import textwrap
+import time
 from typing import Any
 import uuid
 
 import ginjarator.testing
+import jinja2
 import pytest
 
+from dseomn_website import comment_pack
+from dseomn_website import disk_cache
+from dseomn_website import lint
 from dseomn_website import metadata
 from dseomn_website import paths
 
@@ -25,6 +33,59 @@ def _clear_caches() -> None:
     metadata.Error.load.cache_clear()
     metadata.Standalone.load.cache_clear()
     metadata.Post.load.cache_clear()
+    metadata.Post.load_listing.cache_clear()
+    metadata.PostList.main.cache_clear()
+    metadata.PostList.tag.cache_clear()
+    metadata.PostList._posts_by_tag.cache_clear()
+    metadata._load_comment_pack.cache_clear()
+    disk_cache.in_work.cache_clear()
+
+
+def test_load_toml_cached(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    (tmp_path / "ginjarator.toml").write_text(
+        textwrap.dedent(
+            """\
+            source_paths = ["foo.toml"]
+            """
+        )
+    )
+    (tmp_path / "work").mkdir()
+    (tmp_path / "foo.toml").write_text(
+        textwrap.dedent(
+            """\
+            datetime = 2025-07-03 15:47:37-04:00
+            local_datetime = 2025-07-03 15:47:37
+            date = 2025-07-03
+            time = 15:47:37
+            array = [1, 2.5, "three", true, {table = {}}]
+            """
+        )
+    )
+
+    with ginjarator.testing.api_for_scan(root_path=tmp_path):
+        first = metadata._load_toml(ginjarator.paths.Filesystem("foo.toml"))
+        monkeypatch.setattr(metadata.tomllib, "loads", None)
+        second = metadata._load_toml(ginjarator.paths.Filesystem("foo.toml"))
+
+    assert first == second
+    assert second == {
+        "datetime": datetime.datetime(
+            2025,
+            7,
+            3,
+            15,
+            47,
+            37,
+            tzinfo=datetime.timezone(datetime.timedelta(hours=-4)),
+        ),
+        "local_datetime": datetime.datetime(2025, 7, 3, 15, 47, 37),
+        "date": datetime.date(2025, 7, 3),
+        "time": datetime.time(15, 47, 37),
+        "array": [1, 2.5, "three", True, {"table": {}}],
+    }
 
 
 def test_user_parse_error() -> None:
@@ -469,6 +530,55 @@ def test_comment_contents_error(tmp_path: pathlib.Path) -> None:
             comment.contents
 
 
+def test_comment_contents_lint_cached(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    (tmp_path / "ginjarator.toml").write_text(
+        textwrap.dedent(
+            """\
+            source_paths = ["comments"]
+            """
+        )
+    )
+    (tmp_path / "work").mkdir()
+    (tmp_path / "comments").mkdir()
+    (
+        tmp_path / "comments/6c60576a-33eb-4b8c-89d1-f6ab5c5b6ebc.html"
+    ).write_text("<p>kumquat")
+    (
+        tmp_path / "comments/6c60576a-33eb-4b8c-89d1-f6ab5c5b6ebc.toml"
+    ).write_text(
+        textwrap.dedent(
+            """\
+            published = 2025-07-03 15:47:37-04:00
+            author.name = "Someone Else"
+            """
+        )
+    )
+    linted = list[str]()
+    original_lint_comment = lint.comment
+
+    def lint_comment(fragments: str, /) -> None:
+        linted.append(fragments)
+        original_lint_comment(fragments)
+
+    monkeypatch.setattr(lint, "comment", lint_comment)
+
+    with ginjarator.testing.api_for_scan(root_path=tmp_path):
+        for _ in range(2):
+            comment = metadata.Comment.load(
+                parent_url_path="/",
+                parent_path=ginjarator.paths.Filesystem("comments"),
+                comment_id="comment-6c60576a-33eb-4b8c-89d1-f6ab5c5b6ebc",
+                comment_uuid=uuid.UUID("6c60576a-33eb-4b8c-89d1-f6ab5c5b6ebc"),
+            )
+            assert comment.contents == "<p>kumquat"
+
+    assert linted == ["<p>kumquat"]
+    assert (tmp_path / "work/comment-lint-cache.sqlite3").exists()
+
+
 def test_feed() -> None:
     updated = datetime.datetime(2025, 1, 1)
     feed = metadata.Feed[int](
@@ -493,6 +603,9 @@ def test_feed_all() -> None:
         ("errors/404/index.html.jinja", metadata.Error),
         ("standalone/about/index.html.jinja", metadata.Standalone),
         ("posts/2009-06-16-hello-world/index.html.jinja", metadata.Post),
+        ("posts/2013-08-17-europe-trip/gallery.html.jinja", metadata.Post),
+        ("errors/404/gallery.html.jinja", metadata.Error),
+        ("standalone/about/gallery.html.jinja", metadata.Standalone),
     ),
 )
 def test_page_current(template: str, cls: type[metadata.Page]) -> None:
@@ -500,6 +613,28 @@ def test_page_current(template: str, cls: type[metadata.Page]) -> None:
         assert isinstance(metadata.Page.current(), cls)
 
 
+def test_page_gallery_templates() -> None:
+    with ginjarator.testing.api_for_scan():
+        templates = ginjarator.api().fs.read_config().templates
+        gallery_pages = {
+            metadata.Page.for_template(template).url_path
+            for template in templates
+            if template.name == "gallery.html.jinja"
+        }
+        pages_with_galleries = {
+            page.url_path
+            for page in metadata.Page.all()
+            if page.media_item_details_by_source
+        }
+
+    assert {
+        template.with_name("index.html.jinja")
+        for template in templates
+        if template.name == "gallery.html.jinja"
+    } <= set(templates)
+    assert gallery_pages == pages_with_galleries
+
+
 def test_page_current_not_implemented() -> None:
     with ginjarator.testing.api_for_scan(
         current_template="css/common.less.jinja",
@@ -557,6 +692,31 @@ def test_page_media_item_details_by_source() -> None:
     }
 
 
+def test_page_media_item_details_by_gallery() -> None:
+    page = metadata.Page(
+        url_path="/foo/",
+        title="Foo",
+        media=metadata.Media.parse(
+            dict(
+                items=[
+                    dict(type="image", source="a.jpg", alt="", gallery="1"),
+                    dict(type="image", source="b.jpg", alt="", gallery="2"),
+                    dict(type="image", source="c.jpg", alt="", gallery="1"),
+                    dict(type="image", source="d.jpg", alt=""),
+                ],
+            )
+        ),
+    )
+
+    assert {
+        gallery: [item.item.source.name for item in gallery_items]
+        for gallery, gallery_items in page.media_item_details_by_gallery.items()
+    } == {
+        "1": ["a.jpg", "c.jpg"],
+        "2": ["b.jpg"],
+    }
+
+
 def test_media_item_details_create() -> None:
     parent = metadata.Page(
         url_path="/foo/",
@@ -726,6 +886,175 @@ def test_standalone_all() -> None:
     }
 
 
+def test_lazy_sequence() -> None:
+    loads = list[None]()
+
+    def load() -> tuple[int, ...]:
+        loads.append(None)
+        return (1, 2, 3)
+
+    lazy = metadata._LazySequence(load, length=3)
+
+    assert len(lazy) == 3
+    assert not loads
+    assert lazy == (1, 2, 3)
+    assert lazy == metadata._LazySequence(lambda: (1, 2, 3))
+    assert lazy[1:] == (2, 3)
+    assert tuple(reversed(lazy)) == (3, 2, 1)
+    assert len(loads) == 1
+
+
+def test_post_load_comments_lazy(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "public").mkdir()
+    (tmp_path / "public/ginjarator.toml").write_text(
+        textwrap.dedent(
+            """\
+            source_paths = ["posts", "../private"]
+            templates = ["posts/2025-06-27-foo/index.html.jinja"]
+            """
+        )
+    )
+    (tmp_path / "public/posts/2025-06-27-foo").mkdir(parents=True)
+    (tmp_path / "public/posts/2025-06-27-foo/index.html.jinja").write_text("")
+    (tmp_path / "public/posts/2025-06-27-foo/metadata.toml").write_text(
+        textwrap.dedent(
+            """\
+            uuid = "67ed54bc-e214-4177-9846-2236de449037"
+            published = 2025-06-27 14:15:01-04:00
+            title = "Foo"
+            comments = ["096aa7f3-827a-4824-91f0-97da7cbd160b"]
+            """
+        )
+    )
+
+    with ginjarator.testing.api_for_scan(
+        current_template="posts/2025-06-27-foo/index.html.jinja",
+        root_path=(tmp_path / "public"),
+    ):
+        # The comment file doesn't exist, so this would fail if it was loaded.
+        post_metadata = metadata.Post.load(
+            ginjarator.api().paths.current_template
+        )
+
+        assert post_metadata.title == "Foo"
+        assert len(post_metadata.comments) == 1
+
+
+def test_post_compare_does_not_load_comments() -> None:
+    def load() -> Sequence[metadata.Comment]:
+        raise AssertionError("Comments should not be loaded.")
+
+    posts = [
+        metadata.Post(
+            url_path=f"/2025/06/27/{slug}/",
+            title="Foo",
+            id=f"2025-06-27-{slug}",
+            uuid=uuid.uuid4(),
+            published=datetime.datetime(
+                2025, 6, 27, tzinfo=datetime.timezone.utc
+            ),
+            author=metadata.SITE.author,
+            tags=(),
+            url_path_aliases=(),
+            comments=metadata._LazySequence(load, length=1),
+        )
+        for slug in ("foo", "bar")
+    ]
+
+    assert posts[0] != posts[1]
+    assert posts[1] in posts
+    assert posts.index(posts[1]) == 1
+
+
+def test_post_load_comment_pack(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "public").mkdir()
+    (tmp_path / "public/ginjarator.toml").write_text(
+        textwrap.dedent(
+            """\
+            source_paths = ["posts", "../private"]
+            templates = ["posts/2025-06-27-foo/index.html.jinja"]
+            """
+        )
+    )
+    (tmp_path / "public/posts/2025-06-27-foo").mkdir(parents=True)
+    (tmp_path / "public/posts/2025-06-27-foo/index.html.jinja").write_text("")
+    (tmp_path / "public/posts/2025-06-27-foo/metadata.toml").write_text(
+        textwrap.dedent(
+            """\
+            uuid = "67ed54bc-e214-4177-9846-2236de449037"
+            published = 2025-06-27 14:15:01-04:00
+            title = "Foo"
+            comments = [
+                "096aa7f3-827a-4824-91f0-97da7cbd160b",
+                "131294af-bba3-4296-a7e8-1f2eb5ca741c",
+            ]
+            """
+        )
+    )
+    comments_path = tmp_path / "private/posts/2025-06-27-foo/comments"
+    comments_path.mkdir(parents=True)
+    for comment_uuid, published, contents in (
+        (
+            "096aa7f3-827a-4824-91f0-97da7cbd160b",
+            "2025-07-02 16:15:35-04:00",
+            "<p>kumquat",
+        ),
+        (
+            "131294af-bba3-4296-a7e8-1f2eb5ca741c",
+            "2025-07-03 16:15:35-04:00",
+            "<p>Ünïcödé",
+        ),
+    ):
+        (comments_path / f"{comment_uuid}.toml").write_text(
+            f'published = {published}\nauthor.name = "Someone Else"\n'
+        )
+        (comments_path / f"{comment_uuid}.html").write_text(contents)
+    with ginjarator.testing.api_for_scan(
+        current_template="posts/2025-06-27-foo/index.html.jinja",
+        root_path=(tmp_path / "public"),
+    ):
+        unpacked = tuple(
+            (comment, comment.contents)
+            for comment in metadata.Post.load(
+                ginjarator.api().paths.current_template
+            ).comments
+        )
+    metadata.Post.load.cache_clear()
+
+    comment_pack.main(
+        args=(
+            f"--metadata={tmp_path}/public/posts/2025-06-27-foo/metadata.toml",
+            f"--private-dir={tmp_path}/private/posts/2025-06-27-foo",
+            "pack",
+        )
+    )
+    with ginjarator.testing.api_for_scan(
+        current_template="posts/2025-06-27-foo/index.html.jinja",
+        root_path=(tmp_path / "public"),
+    ):
+        packed = tuple(
+            (comment, comment.contents)
+            for comment in metadata.Post.load(
+                ginjarator.api().paths.current_template
+            ).comments
+        )
+
+    assert not comments_path.exists()
+    assert packed == tuple(
+        (
+            dataclasses.replace(
+                comment,
+                contents_path=ginjarator.paths.Filesystem(
+                    "../private/posts/2025-06-27-foo/comments.pack"
+                ),
+                contents_packed=True,
+            ),
+            contents,
+        )
+        for comment, contents in unpacked
+    )
+
+
 @pytest.mark.parametrize(
     "contents,comments_metadata,error_regex",
     (
@@ -912,7 +1241,11 @@ def test_post_load_error(
         root_path=(tmp_path / "public"),
     ):
         with pytest.raises(ValueError, match=error_regex):
-            metadata.Post.load(ginjarator.api().paths.current_template)
+            tuple(
+                metadata.Post.load(
+                    ginjarator.api().paths.current_template
+                ).comments
+            )
 
 
 @pytest.mark.parametrize(
@@ -1152,8 +1485,9 @@ def test_post_load(
         post_metadata = metadata.Post.load(
             ginjarator.api().paths.current_template
         )
-
-    assert post_metadata == expected
+        # Comments are loaded lazily, so this needs to be in the api context.
+        assert post_metadata == expected
+        assert tuple(post_metadata.comments) == tuple(expected.comments)
     assert post_metadata.fragment("bar").id == "2025-06-27-foo-bar"
     assert post_metadata.work_path == ginjarator.paths.Filesystem(
         "work/posts/2025-06-27-foo"
@@ -1181,6 +1515,188 @@ def test_post_load(
     )
 
 
+def _post_with_replies(
+    in_reply_to_by_comment: dict[int, int | None],
+) -> metadata.Post:
+    """Returns a post with comments.
+
+    Args:
+        in_reply_to_by_comment: Map from each comment to the comment it replies
+            to, or None. Comments are identified by the last part of their
+            uuids, and are published in order of their keys.
+    """
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    return metadata.Post(
+        url_path="/2025/06/27/foo/",
+        title="Foo",
+        id="2025-06-27-foo",
+        uuid=uuid.UUID("67ed54bc-e214-4177-9846-2236de449037"),
+        published=start,
+        author=metadata.SITE.author,
+        tags=(),
+        url_path_aliases=frozenset(),
+        comments=tuple(
+            metadata.Comment(
+                url_path=f"/2025/06/27/foo/#2025-06-27-foo-comment-{comment}",
+                uuid=uuid.UUID(int=comment),
+                published=start + datetime.timedelta(minutes=comment),
+                author=metadata.User(name="Someone"),
+                in_reply_to=(
+                    None if in_reply_to is None else uuid.UUID(int=in_reply_to)
+                ),
+                contents_path=ginjarator.paths.Filesystem("unused"),
+            )
+            for comment, in_reply_to in sorted(in_reply_to_by_comment.items())
+        ),
+    )
+
+
+def test_post_comment_thread() -> None:
+    post = _post_with_replies({1: None, 2: 1, 3: None, 4: 2, 5: 1})
+
+    assert [
+        (item.comment.uuid.int, item.depth, item.opening)
+        for item in post.comment_thread
+    ] == [
+        (1, 0, True),
+        (2, 1, True),
+        (4, 2, True),
+        (4, 2, False),
+        (2, 1, False),
+        (5, 1, True),
+        (5, 1, False),
+        (1, 0, False),
+        (3, 0, True),
+        (3, 0, False),
+    ]
+
+
+def test_post_comment_thread_deep() -> None:
+    depth = 10_000
+    post = _post_with_replies(
+        {comment: comment - 1 if comment else None for comment in range(depth)}
+    )
+
+    thread = post.comment_thread
+
+    assert len(thread) == 2 * depth
+    assert [item.depth for item in thread[:depth]] == list(range(depth))
+    assert all(item.opening for item in thread[:depth])
+    assert not any(item.opening for item in thread[depth:])
+
+
+@pytest.mark.parametrize(
+    "in_reply_to_by_comment,expected",
+    (
+        ({}, {}),
+        ({1: None, 2: 1, 3: None}, {1: 1, 2: 1, 3: 1}),
+        (
+            {1: None, 2: None, 3: 2, 4: None, 5: 1, 6: None, 7: None},
+            {1: 1, 2: 2, 3: 2, 4: 2, 5: 1, 6: 3, 7: 3},
+        ),
+        # A thread that's longer than a page is all on one page.
+        (
+            {1: None, 2: 1, 3: 2, 4: 3, 5: None},
+            {1: 1, 2: 1, 3: 1, 4: 1, 5: 2},
+        ),
+    ),
+)
+def test_comment_page_numbers(
+    in_reply_to_by_comment: dict[int, int | None],
+    expected: dict[int, int],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(metadata, "_COMMENTS_PER_PAGE", 3)
+    post = _post_with_replies(in_reply_to_by_comment)
+
+    actual = metadata._comment_page_numbers(post.comments)
+
+    assert {
+        comment_uuid.int: page_number
+        for comment_uuid, page_number in actual.items()
+    } == expected
+
+
+def test_post_comments_page_by_number(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metadata, "_COMMENTS_PER_PAGE", 2)
+    post = _post_with_replies({1: None, 2: 1, 3: None})
+
+    pages = post.comments_page_by_number
+
+    assert pages.keys() == {1, 2}
+    assert pages[1].url_path == "/2025/06/27/foo/"
+    assert pages[1].title == "Foo"
+    assert [
+        (item.comment.uuid.int, item.opening) for item in pages[1].thread
+    ] == [(1, True), (2, True), (2, False), (1, False)]
+    assert pages[2].url_path == "/2025/06/27/foo/comments/page/2/"
+    assert pages[2].title == "Comments (page 2) — Foo"
+    assert pages[2].comments_section.url_path == (
+        "/2025/06/27/foo/comments/page/2/#2025-06-27-foo-comments"
+    )
+    assert [
+        (item.comment.uuid.int, item.opening) for item in pages[2].thread
+    ] == [(3, True), (3, False)]
+
+
+def test_post_comments_page_by_number_no_comments() -> None:
+    post = _post_with_replies({})
+
+    assert post.comments_page_by_number.keys() == {1}
+    assert post.comments_page_by_number[1].thread == ()
+
+
+def test_comments_page_all(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Real posts don't have enough comments for multiple pages.
+    monkeypatch.setattr(metadata, "_COMMENTS_PER_PAGE", 1)
+
+    with ginjarator.testing.api_for_scan():
+        pages = metadata.CommentsPage.all()
+
+    assert pages
+    for page in pages:
+        assert page.page_number > 1
+        assert page.thread
+
+
+def test_comments_page_article(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    (tmp_path / "ginjarator.toml").write_text(
+        textwrap.dedent(
+            """\
+            source_paths = ["unused"]
+            """
+        )
+    )
+    (tmp_path / "unused").write_text("<p>Comment.</p>\n")
+    monkeypatch.setattr(metadata, "_COMMENTS_PER_PAGE", 2)
+    post = _post_with_replies({1: None, 2: 1, 3: None})
+    environment = jinja2.Environment(
+        loader=jinja2.FileSystemLoader("."),
+        extensions=("jinja2.ext.do",),
+        undefined=jinja2.StrictUndefined,
+    )
+
+    with ginjarator.testing.api_for_scan(root_path=tmp_path):
+        environment.globals["ginjarator"] = ginjarator.api()
+        article = environment.from_string(
+            textwrap.dedent(
+                """\
+                {% import "include/article.html.jinja" as article %}
+                {{ article.comments_page_article(
+                  post_metadata=post,
+                  comments_page=post.comments_page_by_number[2],
+                ) }}
+                """
+            )
+        ).render(post=post)
+
+    assert 'id="2025-06-27-foo-comment-3"' in article
+    lint.html(f"<!doctype html><html><body>{article}</body></html>")
+
+
 @pytest.mark.parametrize(
     "source_dir_name_1,metadata_1,source_dir_name_2,metadata_2,error_regex",
     (
@@ -1285,24 +1801,48 @@ def test_post_all() -> None:
     assert actual[0].published > actual[1].published
 
 
-def test_post_all_no_unlisted_comments() -> None:
+def test_post_load_listing() -> None:
+    template = ginjarator.paths.Filesystem(
+        "posts/2013-08-17-europe-trip/index.html.jinja"
+    )
     with ginjarator.testing.api_for_scan():
-        posts = metadata.Post.all()
-
-    for post in posts:
-        comments_path = pathlib.Path(
-            paths.PRIVATE / "posts" / post.id / "comments"
+        post = metadata.Post.load(template)
+        listing = metadata.Post.load_listing(template)
+        from_projection = metadata.Post._parse(
+            template,
+            json.loads(post.listing, object_hook=metadata._toml_from_json),
         )
-        if comments_path.exists():
-            comments_filenames = {
-                child.name for child in comments_path.iterdir()
+
+    assert post.media.item_by_source
+    for actual in (listing, from_projection):
+        assert actual.media == metadata.Media.parse({})
+        assert dataclasses.replace(
+            actual, media=post.media, comments=()
+        ) == dataclasses.replace(post, comments=())
+
+
+def test_post_all_no_unlisted_comments() -> None:
+    with ginjarator.testing.api_for_scan():
+        for post in metadata.Post.all():
+            comments_path = pathlib.Path(
+                paths.PRIVATE / "posts" / post.id / "comments"
+            )
+            if pathlib.Path(
+                paths.PRIVATE / "posts" / post.id / "comments.pack"
+            ).exists():
+                # Post.load checks that packed comments are all listed.
+                assert not comments_path.exists()
+                continue
+            if comments_path.exists():
+                comments_filenames = {
+                    child.name for child in comments_path.iterdir()
+                }
+            else:
+                comments_filenames = set()
+            assert comments_filenames == {
+                *(f"{comment.uuid}.html" for comment in post.comments),
+                *(f"{comment.uuid}.toml" for comment in post.comments),
             }
-        else:
-            comments_filenames = set()
-        assert comments_filenames == {
-            *(f"{comment.uuid}.html" for comment in post.comments),
-            *(f"{comment.uuid}.toml" for comment in post.comments),
-        }
 
 
 def test_post_list_page_all() -> None:
@@ -1315,7 +1855,7 @@ def test_post_list_page_all() -> None:
 def test_post_list_main() -> None:
     with ginjarator.testing.api_for_scan():
         assert tuple(metadata.PostList.main().posts) == tuple(
-            metadata.Post.all()
+            metadata.Post.all_listings()
         )
 
 
@@ -1327,6 +1867,12 @@ def test_post_list_tag() -> None:
     assert all("dance" in post.tags for post in posts)
 
 
+def test_post_list_interned() -> None:
+    with ginjarator.testing.api_for_scan():
+        assert metadata.PostList.main() is metadata.PostList.main()
+        assert metadata.PostList.tag("dance") is metadata.PostList.tag("dance")
+
+
 def test_post_list_all() -> None:
     with ginjarator.testing.api_for_scan():
         lists = metadata.PostList.all()
@@ -1335,34 +1881,206 @@ def test_post_list_all() -> None:
         assert all(post_list.feed.entries for post_list in lists)
 
 
+def test_post_list_templates() -> None:
+    with ginjarator.testing.api_for_scan():
+        config_templates = {
+            template
+            for template in ginjarator.api().fs.read_config().templates
+            if template.is_relative_to("lists")
+        }
+        list_templates = [
+            template
+            for post_list in metadata.PostList.all()
+            for template in post_list.templates
+        ]
+
+    assert len(list_templates) == len(set(list_templates))
+    assert set(list_templates) == config_templates
+
+
+def test_post_list_current() -> None:
+    with ginjarator.testing.api_for_scan(
+        current_template="lists/tag/dance.atom.jinja"
+    ):
+        assert metadata.PostList.current() is metadata.PostList.tag("dance")
+
+
 def test_post_list_pages() -> None:
     with ginjarator.testing.api_for_scan():
         pages = metadata.PostList.main().page_by_number
 
+    newest = len(pages)
     with pytest.raises(LookupError):
         pages[0]
-    assert pages[1].url_path == "/"
-    assert pages[1].title == "Blog"
+    assert list(pages) == list(range(newest, 0, -1))
+    assert pages[newest].url_path == "/"
+    assert pages[newest].title == "Blog"
+    assert pages[newest].page_number == newest
+    assert pages[1].url_path == "/page/1/"
+    assert pages[1].title == "Blog (page 1)"
     assert pages[1].page_number == 1
-    assert pages[2].url_path == "/page/2/"
-    assert pages[2].title == "Blog (page 2)"
-    assert pages[2].page_number == 2
     assert all(page.posts for page in pages.values())
 
 
+def _post_list_with_posts(
+    post_count: int,
+    *,
+    days_apart: int = 1,
+) -> metadata.PostList:
+    post_list = metadata.PostList(url_path="/", title="Blog", filter_tag=None)
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    # This bypasses PostList.posts loading all posts from the filesystem.
+    post_list.__dict__["posts"] = tuple(
+        metadata.Post(
+            url_path=f"/post-{post}/",
+            title=f"Post {post}",
+            id=f"post-{post}",
+            uuid=uuid.UUID(int=post),
+            published=start + datetime.timedelta(days=post * days_apart),
+            author=metadata.SITE.author,
+            tags=(),
+            url_path_aliases=frozenset(),
+            comments=(),
+        )
+        for post in reversed(range(post_count))
+    )
+    return post_list
+
+
+def test_post_list_pages_stable(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metadata, "_POSTS_PER_PAGE", 2)
+
+    pages = _post_list_with_posts(5).page_by_number
+    pages_after_publishing = _post_list_with_posts(6).page_by_number
+
+    assert list(pages) == [3, 2, 1]
+    assert [
+        (page.url_path, page.title, [post.id for post in page.posts])
+        for page in pages.values()
+    ] == [
+        ("/", "Blog", ["post-4"]),
+        ("/page/2/", "Blog (page 2)", ["post-3", "post-2"]),
+        ("/page/1/", "Blog (page 1)", ["post-1", "post-0"]),
+    ]
+    assert pages_after_publishing[1] == pages[1]
+    assert pages_after_publishing[2] == pages[2]
+    assert [post.id for post in pages_after_publishing[3].posts] == [
+        "post-5",
+        "post-4",
+    ]
+
+
+def test_post_list_page_nav_unstable(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metadata, "_STABLE_PAGINATION", False)
+    post_list = _post_list_with_posts(200)
+
+    assert post_list.newer_page_number(5) == 4
+    assert post_list.older_page_number(5) == 6
+    assert post_list.page_nav(10) == (1, None, 8, 9, 10, 11, 12, None, 20)
+    assert post_list.page_link(1) == "/"
+    assert post_list.newest_page_link is None
+
+
+def test_post_list_page_nav() -> None:
+    post_list = _post_list_with_posts(200)
+
+    assert post_list.newer_page_number(5) == 6
+    assert post_list.older_page_number(5) == 4
+    assert post_list.page_nav(10) == (11, 10, 9, 8, None, 1)
+    assert post_list.page_nav(17) == (18, 17, 16, 15, None, 1)
+    assert post_list.page_nav(20) == (20, 19, 18, None, 1)
+    assert post_list.page_link(20) == "/page/20/"
+    assert post_list.newest_page_link == "/page/20/"
+
+
+def _list_page_contents(
+    post_list: metadata.PostList,
+    page_number: int,
+) -> object:
+    """Returns everything from the list that's on one of its pages."""
+    page = post_list.page_by_number[page_number]
+    return (
+        page.url_path,
+        page.title,
+        tuple(post.id for post in page.posts),
+        tuple(
+            None if nav_page is None else post_list.page_link(nav_page)
+            for nav_page in post_list.page_nav(page_number)
+        ),
+        *(
+            (
+                post_list.page_link(target)
+                if target in post_list.page_by_number
+                else None
+            )
+            for target in (
+                post_list.newer_page_number(page_number),
+                post_list.older_page_number(page_number),
+            )
+        ),
+        post_list.link_by_year(page_number),
+    )
+
+
+@pytest.mark.parametrize(
+    "post_count,days_apart,expected_changed",
+    (
+        (5, 1, {3}),
+        (6, 1, {3, 4}),
+        (39, 1, {20}),
+        (40, 1, {20, 21}),
+        # With 73 days apart, every fifth post starts a new year.
+        (5, 73, {3}),
+        (10, 73, {5, 6}),
+    ),
+)
+def test_post_list_publish_changes_few_pages(
+    post_count: int,
+    days_apart: int,
+    expected_changed: set[int],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(metadata, "_POSTS_PER_PAGE", 2)
+    before = _post_list_with_posts(post_count, days_apart=days_apart)
+    after = _post_list_with_posts(post_count + 1, days_apart=days_apart)
+
+    changed = {
+        page_number
+        for page_number in after.page_by_number
+        if page_number not in before.page_by_number
+        or _list_page_contents(after, page_number)
+        != _list_page_contents(before, page_number)
+    }
+
+    assert changed == expected_changed
+
+
 def test_post_list_link_by_year() -> None:
     with ginjarator.testing.api_for_scan():
         post_list = metadata.PostList.main()
-        most_recent_2025 = max(
+        oldest_2025 = min(
             (post for post in post_list.posts if post.published.year == 2025),
             key=lambda post: post.published,
         )
+        link_by_year = post_list.link_by_year(len(post_list.page_by_number))
+
+        assert link_by_year[2025].endswith(f"#{oldest_2025.id}")
+        assert list(link_by_year) == sorted(link_by_year, reverse=True)
 
-        assert post_list.link_by_year[2025].endswith(f"#{most_recent_2025.id}")
-        assert list(post_list.link_by_year) == sorted(
-            post_list.link_by_year,
-            reverse=True,
-        )
+
+def test_post_list_link_by_year_older_page(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(metadata, "_POSTS_PER_PAGE", 2)
+    post_list = _post_list_with_posts(20, days_apart=73)
+
+    assert post_list.link_by_year(2) == {
+        2025: "/page/1/#post-0",
+    }
+    assert post_list.link_by_year(3) == {
+        2026: "/page/3/#post-5",
+        2025: "/page/1/#post-0",
+    }
 
 
 def test_post_list_feed() -> None:
@@ -1483,6 +2201,92 @@ def test_post_list_comments_feed(
         )
 
 
+def _comment(name: str, minute: int) -> metadata.Comment:
+    return metadata.Comment(
+        url_path=f"/post/#{name}",
+        uuid=uuid.uuid4(),
+        published=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        + datetime.timedelta(minutes=minute),
+        author=metadata.User(name="Someone"),
+        in_reply_to=None,
+        contents_path=ginjarator.paths.Filesystem("unused"),
+    )
+
+
+def test_newest_comments_ties() -> None:
+    comments_by_post = [
+        [_comment("a0", 0), _comment("a1", 1), _comment("a2", 1)],
+        [],
+        [_comment("b0", 1), _comment("b1", 2)],
+        [_comment("c0", 1)],
+    ]
+
+    actual = metadata._newest_comments(comments_by_post)
+
+    assert list(actual) == sorted(
+        itertools.chain.from_iterable(comments_by_post),
+        key=lambda comment: comment.published,
+        reverse=True,
+    )
+    assert [comment.id for comment in actual] == [
+        "b1",
+        "a1",
+        "a2",
+        "b0",
+        "c0",
+        "a0",
+    ]
+
+
+def test_newest_comments_skips_posts_without_comments() -> None:
+    def load() -> Sequence[metadata.Comment]:
+        raise AssertionError("Comments should not be loaded.")
+
+    actual = metadata._newest_comments(
+        (
+            [_comment("a0", 0)],
+            metadata._LazySequence(load, length=0),
+        )
+    )
+
+    assert [comment.id for comment in actual] == ["a0"]
+
+
+@pytest.mark.slow
+def test_newest_comments_benchmark() -> None:
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    comments_by_post = [
+        [
+            metadata.Comment(
+                url_path=f"/post-{post}/#comment-{comment}",
+                uuid=uuid.uuid4(),
+                published=start
+                + datetime.timedelta(minutes=comment * 1000 + post),
+                author=metadata.User(name="Someone"),
+                in_reply_to=None,
+                contents_path=ginjarator.paths.Filesystem("unused"),
+            )
+            for comment in range(100)
+        ]
+        for post in range(1000)
+    ]
+
+    merge_start = time.perf_counter()
+    actual = metadata._newest_comments(comments_by_post)
+    merge_seconds = time.perf_counter() - merge_start
+    sort_start = time.perf_counter()
+    expected = sorted(
+        itertools.chain.from_iterable(comments_by_post),
+        key=lambda comment: comment.published,
+        reverse=True,
+    )[: len(actual)]
+    sort_seconds = time.perf_counter() - sort_start
+
+    assert len(actual) == 50
+    assert list(actual) == expected
+    assert merge_seconds < sort_seconds
+
+
 def test_main_nav() -> None:
     with ginjarator.testing.api_for_scan():
         assert metadata.main_nav()
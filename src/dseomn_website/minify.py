@@ -2,24 +2,173 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import functools
+import hashlib
+import importlib.metadata
+import pathlib
+import re
 import subprocess
 
+import ginjarator
 
-def html(document_or_fragments: str) -> str:
-    return subprocess.run(
-        ("minify", "--quiet", "--type=html"),
-        input=document_or_fragments,
+from dseomn_website import disk_cache
+
+# The tdewolff-minify python package wraps the same library as the minify
+# command, so it produces the same output without spawning a process for each
+# call, as long as their versions match. The command is used as a fallback when
+# the package isn't installed.
+try:
+    import minify as _binding
+except ImportError:
+    _binding = None
+
+_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# Already minified fragments, by the hex sha256 of their contents.
+_preminified: dict[str, str] = {}
+_PREMINIFIED_HTML_PLACEHOLDER = re.compile(
+    r'<div data-preminified="?([0-9a-f]{64})"?></div>'
+)
+_PREMINIFIED_XML_PLACEHOLDER = re.compile(
+    r'<preminified key="([0-9a-f]{64})"/>'
+)
+
+
+_COMMAND_VERSION = re.compile(r"\bv?([0-9]+(?:\.[0-9]+)+)\b")
+
+
+def _binding_version() -> str:
+    return importlib.metadata.version("tdewolff-minify")
+
+
+def _command_version() -> str:
+    output = subprocess.run(
+        ("minify", "--version"),
         stdout=subprocess.PIPE,
         check=True,
         text=True,
     ).stdout
+    if (match := _COMMAND_VERSION.search(output)) is None:
+        raise ValueError(f"Unexpected output from minify --version: {output!r}")
+    return match[1]
 
 
-def xml(document_or_fragments: str) -> str:
+@functools.cache
+def _version() -> str:
+    """Returns the version of minify that's used.
+
+    Raises:
+        ValueError: The binding and the command are both installed, with
+            different versions. Their output could differ, so the output would
+            depend on which one is used.
+    """
+    if _binding is None:
+        return _command_version()
+    binding_version = _binding_version()
+    try:
+        command_version = _command_version()
+    except FileNotFoundError:
+        return binding_version
+    if binding_version != command_version:
+        raise ValueError(
+            f"tdewolff-minify {binding_version} doesn't match the minify "
+            f"command's version {command_version}."
+        )
+    return binding_version
+
+
+def _minify_uncached(
+    document_or_fragments: str,
+    *,
+    type_: str,
+    mediatype: str,
+) -> str:
+    if _binding is not None:
+        result: str = _binding.string(mediatype, document_or_fragments)
+        return result
     return subprocess.run(
-        ("minify", "--quiet", "--type=xml"),
+        ("minify", "--quiet", f"--type={type_}"),
         input=document_or_fragments,
         stdout=subprocess.PIPE,
         check=True,
         text=True,
     ).stdout
+
+
+def _minify(document_or_fragments: str, *, type_: str, mediatype: str) -> str:
+    version = _version()
+    cache = disk_cache.in_work(
+        "minify-cache.sqlite3",
+        max_size=_CACHE_MAX_SIZE,
+        root=pathlib.Path(ginjarator.api().fs.root),
+    )
+    if cache is None:
+        return _minify_uncached(
+            document_or_fragments,
+            type_=type_,
+            mediatype=mediatype,
+        )
+    key = hashlib.sha256(
+        "\0".join((version, type_, document_or_fragments)).encode()
+    ).digest()
+    if (cached := cache.get(key)) is not None:
+        return cached.decode()
+    result = _minify_uncached(
+        document_or_fragments,
+        type_=type_,
+        mediatype=mediatype,
+    )
+    cache.set(key, result.encode())
+    return result
+
+
+def _preminified_key(fragment: str) -> str:
+    key = hashlib.sha256(fragment.encode()).hexdigest()
+    _preminified[key] = fragment
+    return key
+
+
+def _replace_preminified(minified: str, placeholder: re.Pattern[str]) -> str:
+    def replacement(match: re.Match[str]) -> str:
+        if (fragment := _preminified.get(match[1])) is None:
+            raise ValueError(f"Unknown preminified fragment: {match[1]!r}")
+        return fragment
+
+    return placeholder.sub(replacement, minified)
+
+
+def preminified_html(fragment: str | None) -> str:
+    """Returns a placeholder for a fragment that's already minified.
+
+    html() replaces the placeholder after minifying the rest of its input, so
+    the fragment isn't minified again. The fragment must be a block-level
+    element, so that minifying the whitespace around the placeholder has the
+    same result as minifying the whitespace around the fragment.
+    """
+    if fragment is None:
+        return ""
+    return f'<div data-preminified="{_preminified_key(fragment)}"></div>'
+
+
+def preminified_xml(fragment: str | None) -> str:
+    """Returns a placeholder for an element that's already minified.
+
+    See preminified_html().
+    """
+    if fragment is None:
+        return ""
+    return f'<preminified key="{_preminified_key(fragment)}"/>'
+
+
+def html(document_or_fragments: str) -> str:
+    return _replace_preminified(
+        _minify(document_or_fragments, type_="html", mediatype="text/html"),
+        _PREMINIFIED_HTML_PLACEHOLDER,
+    )
+
+
+def xml(document_or_fragments: str) -> str:
+    return _replace_preminified(
+        _minify(document_or_fragments, type_="xml", mediatype="text/xml"),
+        _PREMINIFIED_XML_PLACEHOLDER,
+    )
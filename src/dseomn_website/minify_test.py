@@ -2,12 +2,193 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from collections.abc import Callable, Generator
+import pathlib
+import subprocess
+import time
+import types
+from typing import Any
+
+import ginjarator
+import ginjarator.testing
+import pytest
+
+from dseomn_website import disk_cache
 from dseomn_website import minify
 
 
+@pytest.fixture(autouse=True)
+def _root_path(tmp_path: pathlib.Path) -> Generator[None, None, None]:
+    disk_cache.in_work.cache_clear()
+    minify._version.cache_clear()
+    with ginjarator.testing.api_for_scan(root_path=tmp_path):
+        yield
+    disk_cache.in_work.cache_clear()
+    minify._version.cache_clear()
+
+
+@pytest.fixture(params=("binding", "subprocess"))
+def _backend(
+    request: pytest.FixtureRequest,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    if request.param == "binding":
+        if minify._binding is None:
+            pytest.skip("tdewolff-minify is not installed")
+    else:
+        monkeypatch.setattr(minify, "_binding", None)
+
+
+@pytest.mark.usefixtures("_backend")
 def test_html() -> None:
     assert minify.html("<p>foo</p>\n") == "<p>foo"
 
 
+@pytest.mark.usefixtures("_backend")
 def test_xml() -> None:
     assert minify.xml("<foo />\n") == "<foo/>"
+
+
+@pytest.mark.usefixtures("_backend")
+def test_html_preminified() -> None:
+    fragment = "<article>\n  <p>foo  bar</p>\n</article>\n"
+    document = "<main>\n  <h1>title</h1>\n  {}\n  <p>baz</p>\n</main>\n"
+
+    actual = minify.html(
+        document.format(minify.preminified_html(minify.html(fragment)))
+    )
+
+    assert actual == minify.html(document.format(fragment))
+    assert "preminified" not in actual
+
+
+@pytest.mark.usefixtures("_backend")
+def test_xml_preminified() -> None:
+    fragment = "<entry>\n  <title>foo  bar</title>\n</entry>\n"
+    document = "<feed>\n  <id>foo</id>\n  {}\n</feed>\n"
+
+    actual = minify.xml(
+        document.format(minify.preminified_xml(minify.xml(fragment)))
+    )
+
+    assert actual == minify.xml(document.format(fragment))
+    assert "preminified" not in actual
+
+
+@pytest.mark.usefixtures("_backend")
+def test_html_preminified_unknown() -> None:
+    with pytest.raises(ValueError, match="Unknown preminified fragment"):
+        minify.html(f'<main><div data-preminified="{"0" * 64}"></div></main>\n')
+
+
+def test_preminified_none() -> None:
+    assert minify.preminified_html(None) == ""
+    assert minify.preminified_xml(None) == ""
+
+
+def test_html_cached(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    (tmp_path / "work").mkdir()
+    monkeypatch.setattr(minify, "_version", lambda: "some-version")
+    inputs = list[str]()
+
+    def fake_minify_uncached(document_or_fragments: str, **kwargs: Any) -> str:
+        inputs.append(document_or_fragments)
+        return "minified"
+
+    monkeypatch.setattr(minify, "_minify_uncached", fake_minify_uncached)
+
+    first = minify.html("<p>foo</p>\n")
+    second = minify.html("<p>foo</p>\n")
+    xml = minify.xml("<p>foo</p>\n")
+
+    assert (first, second, xml) == ("minified", "minified", "minified")
+    assert inputs == ["<p>foo</p>\n", "<p>foo</p>\n"]
+    assert (tmp_path / "work/minify-cache.sqlite3").exists()
+
+
+def _fake_binding(monkeypatch: pytest.MonkeyPatch, *, version: str) -> None:
+    monkeypatch.setattr(
+        minify,
+        "_binding",
+        types.SimpleNamespace(string=lambda mediatype, value: "minified"),
+    )
+    monkeypatch.setattr(minify, "_binding_version", lambda: version)
+
+
+def test_version_binding_matches_command(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _fake_binding(monkeypatch, version="2.20.37")
+    monkeypatch.setattr(minify, "_command_version", lambda: "2.20.37")
+
+    assert minify.html("<p>foo</p>\n") == "minified"
+    assert minify._version() == "2.20.37"
+
+
+def test_version_binding_without_command(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _fake_binding(monkeypatch, version="2.20.37")
+
+    def command_version() -> str:
+        raise FileNotFoundError("minify")
+
+    monkeypatch.setattr(minify, "_command_version", command_version)
+
+    assert minify._version() == "2.20.37"
+
+
+def test_version_binding_mismatch(monkeypatch: pytest.MonkeyPatch) -> None:
+    _fake_binding(monkeypatch, version="2.20.37")
+    monkeypatch.setattr(minify, "_command_version", lambda: "2.12.4")
+
+    with pytest.raises(ValueError, match="doesn't match"):
+        minify.html("<p>foo</p>\n")
+
+
+def test_command_version(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        subprocess,
+        "run",
+        lambda *args, **kwargs: subprocess.CompletedProcess(
+            args=args,
+            returncode=0,
+            stdout="minify v2.12.4\n",
+        ),
+    )
+
+    assert minify._command_version() == "2.12.4"
+
+
+def _time_fragments(
+    minify_function: Callable[[str], str],
+    fragments: list[str],
+) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    results = [minify_function(fragment) for fragment in fragments]
+    return time.perf_counter() - start, results
+
+
+@pytest.mark.slow
+def test_html_many_fragments_benchmark(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    if minify._binding is None:
+        pytest.skip("tdewolff-minify is not installed")
+    fragments = [
+        f'<article id="comment-{i}">\n  <p>Comment <b>{i}</b>.</p>\n</article>\n'
+        for i in range(500)
+    ]
+
+    binding_seconds, binding_results = _time_fragments(minify.html, fragments)
+    with monkeypatch.context() as context:
+        context.setattr(minify, "_binding", None)
+        subprocess_seconds, subprocess_results = _time_fragments(
+            minify.html, fragments
+        )
+
+    assert binding_results == subprocess_results
+    assert binding_seconds < subprocess_seconds
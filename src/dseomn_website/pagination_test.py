@@ -22,3 +22,17 @@ from dseomn_website import pagination
 )
 def test_nav(current: int, total: int, expected: list[int | None]) -> None:
     assert list(pagination.nav(current=current, total=total)) == expected
+
+
+def test_nav_many_pages() -> None:
+    assert list(pagination.nav(current=10**12, total=2 * 10**12)) == [
+        1,
+        None,
+        10**12 - 2,
+        10**12 - 1,
+        10**12,
+        10**12 + 1,
+        10**12 + 2,
+        None,
+        2 * 10**12,
+    ]
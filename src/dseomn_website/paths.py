@@ -13,6 +13,11 @@ WORK = ginjarator.paths.Filesystem("work")
 
 OUTPUT = ginjarator.paths.Filesystem("output")
 ASSETS = OUTPUT / "assets"
+# Number of levels of subdirectories of ASSETS, named with pairs of characters
+# from the hash. E.g., with a depth of 2, assets are in ASSETS / "ab/cd".
+ASSETS_SHARD_DEPTH = 2
+# Length of the hash in asset filenames.
+ASSETS_HASH_LENGTH = 24
 DIR_INDEXES = (
     "index.html",  # Should probably come first for performance, maybe?
     "index.atom",
@@ -77,6 +77,7 @@ def test_to_url_path_error(path: str, error_regex: str) -> None:
         ("output/foo/index.html", "/foo/"),
         ("output/foo", "/foo"),
         ("output/foo bar", "/foo%20bar"),
+        ("output/assets/ab/cd/foo-abcd.png", "/assets/ab/cd/foo-abcd.png"),
     ),
 )
 def test_to_url_path(path: str, expected: str) -> None: